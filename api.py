@@ -1,22 +1,151 @@
 import os
-import requests
+import re
+import threading
 import time
+from collections import deque
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
+from http_client import get
+from response_cache import CACHE
 
 load_dotenv()  # .env
 
 API_KEY = os.getenv("RIOT_API_KEY")
 
-TIME_SINCE_BREAK = time.time()
-REQ_SINCE_BREAK = 0
-REQ_LIMIT = 100
-REQ_TIME_LIMIT = 120
+# Development key limits, used until the host tells us the real ones
+DEFAULT_APP_LIMITS = [(20, 1), (100, 120)]
+DEFAULT_METHOD_LIMITS = []
+DEFAULT_RETRY_AFTER = 10
+
+# Path parameters (puuids, match ids, tiers, ...) are replaced so that every call
+# to the same endpoint shares a single method bucket
+METHOD_PATTERNS = [
+    (re.compile(r"^/lol/match/v5/matches/by-puuid/[^/]+/ids$"), "/lol/match/v5/matches/by-puuid/{puuid}/ids"),
+    (re.compile(r"^/lol/match/v5/matches/[^/]+/timeline$"), "/lol/match/v5/matches/{matchId}/timeline"),
+    (re.compile(r"^/lol/match/v5/matches/[^/]+$"), "/lol/match/v5/matches/{matchId}"),
+    (re.compile(r"^/riot/account/v1/accounts/by-riot-id/[^/]+/[^/]+$"), "/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}"),
+    (re.compile(r"^/lol/league-exp/v4/entries/[^/]+/[^/]+/[^/]+$"), "/lol/league-exp/v4/entries/{queue}/{tier}/{division}"),
+    (re.compile(r"^/lol/league/v4/entries/by-puuid/[^/]+$"), "/lol/league/v4/entries/by-puuid/{puuid}"),
+]
+
+def parse_rate_limits(header):
+    """Parse a header like "20:1,100:120" into [(20, 1), (100, 120)]."""
+    limits = []
+    for limit in header.split(","):
+        count, seconds = limit.strip().split(":")
+        limits.append((int(count), int(seconds)))
+    return limits
+
+def get_method(url):
+    path = urlsplit(url).path
+    for pattern, method in METHOD_PATTERNS:
+        if pattern.match(path):
+            return method
+    return path
+
+class TokenBucket:
+    """
+    Holds `limit` tokens, each one taken is given back `seconds` after being used.
+    This way no window of `seconds` ever sees more than `limit` requests.
+    """
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.taken = deque()
+
+    def wait_time(self, now):
+        while self.taken and self.taken[0] + self.seconds <= now:
+            self.taken.popleft()
+        if len(self.taken) < self.limit:
+            return 0
+        return self.taken[0] + self.seconds - now
+
+    def take(self, now):
+        self.taken.append(now)
+
+class RateLimiter:
+    """
+    Thread-safe limiter with one set of buckets per routing host (app limits) and
+    one per host and method (method limits). Limits are updated from the
+    X-App-Rate-Limit and X-Method-Rate-Limit headers of every response.
+    """
+    def __init__(self, app_limits=DEFAULT_APP_LIMITS, method_limits=DEFAULT_METHOD_LIMITS):
+        self.default_app_limits = app_limits
+        self.default_method_limits = method_limits
+        self.app_buckets = {}
+        self.method_buckets = {}
+        self.blocked_until = {}
+        self.lock = threading.Lock()
+
+    def _buckets(self, host, method):
+        if host not in self.app_buckets:
+            self.app_buckets[host] = [TokenBucket(*limit) for limit in self.default_app_limits]
+        if (host, method) not in self.method_buckets:
+            self.method_buckets[(host, method)] = [TokenBucket(*limit) for limit in self.default_method_limits]
+        return self.app_buckets[host] + self.method_buckets[(host, method)]
+
+    def acquire(self, url):
+        """Block until a request to url can be made without exceeding any limit."""
+        host = urlsplit(url).hostname
+        method = get_method(url)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                buckets = self._buckets(host, method)
+                wait = max(
+                    [bucket.wait_time(now) for bucket in buckets] + [
+                        self.blocked_until.get(host, 0) - now,
+                        self.blocked_until.get((host, method), 0) - now,
+                    ]
+                )
+                if wait <= 0:
+                    for bucket in buckets:
+                        bucket.take(now)
+                    return
+            time.sleep(wait)
+
+    def _resize(self, buckets, limits):
+        # Keeps the requests already made so a limit change doesn't reset the windows
+        current = {(bucket.limit, bucket.seconds): bucket for bucket in buckets}
+        resized = []
+        for limit, seconds in limits:
+            bucket = current.get((limit, seconds))
+            if bucket is None:
+                bucket = TokenBucket(limit, seconds)
+                for old in buckets:
+                    if old.seconds == seconds:
+                        bucket.taken = old.taken
+            resized.append(bucket)
+        return resized
+
+    def update(self, url, response):
+        """Update limits from the response headers, blocking the host on 429."""
+        host = urlsplit(url).hostname
+        method = get_method(url)
+        headers = response.headers
+        with self.lock:
+            self._buckets(host, method)
+            if "X-App-Rate-Limit" in headers:
+                limits = parse_rate_limits(headers["X-App-Rate-Limit"])
+                self.app_buckets[host] = self._resize(self.app_buckets[host], limits)
+            if "X-Method-Rate-Limit" in headers:
+                limits = parse_rate_limits(headers["X-Method-Rate-Limit"])
+                self.method_buckets[(host, method)] = self._resize(self.method_buckets[(host, method)], limits)
+            if response.status_code == 429:
+                retry_after = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+                # Method limits only block their own endpoint, anything else blocks the host
+                key = (host, method) if headers.get("X-Rate-Limit-Type") == "method" else host
+                self.blocked_until[key] = max(self.blocked_until.get(key, 0), time.monotonic() + retry_after)
+                return retry_after
+        return 0
+
+LIMITER = RateLimiter()
 
 def safe_request(url, headers, max_tries=3000):
     tries = 0
     while tries < max_tries:
         try:
-            return requests.get(url, headers=headers)
+            return get(url, headers=headers)
         except KeyboardInterrupt:
             print("Request interrupted by user.")
             raise
@@ -25,22 +154,18 @@ def safe_request(url, headers, max_tries=3000):
             tries += 1
     raise Exception(f"Max tries exceeded while fetching request for url {url}")
 
-def make_request(url):
+def make_request(url, use_cache=True):
+    if use_cache:
+        response = CACHE.get(url)
+        if response is not None:
+            return response
     headers = {"X-Riot-Token": API_KEY}
-    response = safe_request(url, headers)
-    global TIME_SINCE_BREAK, REQ_SINCE_BREAK
-    REQ_SINCE_BREAK += 1
-    cond1 = REQ_SINCE_BREAK >= REQ_LIMIT
-    cond2 = response.status_code == 429
-    if cond1 or cond2:
-        elapsed_time = time.time() - TIME_SINCE_BREAK
-        if elapsed_time < REQ_TIME_LIMIT:
-            sleep_time = REQ_TIME_LIMIT - elapsed_time if cond1 else 10
-            print(f"\033[93mRate limit reached ({'stopping before getting denied' if cond1 else 'denied by host'}). Sleeping for {sleep_time:.2f} seconds.\033[0m")
-            time.sleep(sleep_time)
-            print("We're so back")
-        TIME_SINCE_BREAK = time.time()
-        REQ_SINCE_BREAK = 0
-    if cond2:
-        response = make_request(url) # retry the request if rate limit is hit
-    return response
\ No newline at end of file
+    while True:
+        LIMITER.acquire(url)
+        response = safe_request(url, headers)
+        retry_after = LIMITER.update(url, response)
+        if response.status_code != 429:
+            if use_cache and response.status_code == 200:
+                CACHE.put(url, response)
+            return response
+        print(f"\033[93mRate limit reached (denied by host). Retrying in {retry_after:.2f} seconds.\033[0m")
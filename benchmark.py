@@ -0,0 +1,264 @@
+"""
+Throughput of the pipeline stages on synthetic matches (see synthetic_matches), from
+the match JSON to the scored training rows. Everything runs in a scratch folder, so
+the real indexes and features are never touched.
+
+Results can be saved as a baseline, later runs with the same settings are compared
+to it and the script exits with 1 when a stage got slower than the tolerance allows.
+"""
+import os
+import io
+import sys
+import json
+import time
+import glob
+import shutil
+import tempfile
+import platform
+import contextlib
+from argparse import ArgumentParser
+import numpy as np
+
+BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+MATCHES = 100
+# A stage regresses when its throughput drops more than this below the baseline
+TOLERANCE = 0.25
+# Predictions scored by the metrics stage, the dataset rows are repeated up to this
+METRIC_ROWS = 1000000
+TIMELINE_BATCH_SIZE = 4
+# Stages faster than this in the baseline are reported but too noisy to flag
+MIN_STAGE_SECONDS = 0.05
+
+def peak_rss_mb():
+    """Highest resident memory of this process so far, None where resource doesn't exist."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+class StageTimer:
+    """Time, throughput and memory of each stage, in the order they ran."""
+    def __init__(self, verbose=False):
+        self.stages = {}
+        self.verbose = verbose
+
+    def run(self, name, unit, funct, *args, count=None, **kwargs):
+        """Run funct, count is the number of units it handled (or a function of its result)."""
+        rss_before = peak_rss_mb()
+        output = io.StringIO()
+        # extract_match prints every match it reads
+        with contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(output):
+            start = time.perf_counter()
+            result = funct(*args, **kwargs)
+            seconds = time.perf_counter() - start
+        units = count(result) if callable(count) else count
+        rss_after = peak_rss_mb()
+        self.stages[name] = {
+            "seconds": seconds,
+            "unit": unit,
+            "count": units,
+            "per_second": units / seconds if units and seconds > 0 else None,
+            "peak_rss_mb": rss_after,
+            "rss_growth_mb": rss_after - rss_before if rss_after is not None else None,
+        }
+        return result
+
+    def report(self):
+        print(f"{'stage':<28}{'seconds':>10}{'count':>10}{'per second':>24}{'peak RSS MB':>14}")
+        for name, stage in self.stages.items():
+            per_second = f"{stage['per_second']:.1f} {stage['unit']}/s" if stage["per_second"] else "-"
+            rss = f"{stage['peak_rss_mb']:.0f}" if stage["peak_rss_mb"] is not None else "-"
+            print(f"{name:<28}{stage['seconds']:>10.3f}{stage['count'] or 0:>10}{per_second:>24}{rss:>14}")
+
+def prepare_workspace(folder, synthetic_data=False):
+    """
+    Game data of the benchmark in folder/game_data: the current snapshot when there is
+    one, otherwise (or with synthetic_data) a generated catalog. Returns its description.
+    """
+    from static_data import current_version, snapshot_folder, has_snapshot, SNAPSHOT_FILES
+    from synthetic_matches import synthetic_game_data
+    target = os.path.join(folder, "game_data")
+    version = None if synthetic_data else current_version()
+    if version and has_snapshot(version):
+        os.makedirs(target, exist_ok=True)
+        for fn in SNAPSHOT_FILES:
+            shutil.copy(os.path.join(snapshot_folder(version), fn), target)
+        return f"snapshot {version}"
+    synthetic_game_data(target)
+    return "synthetic"
+
+def load_matches(matches_dir, timelines_dir):
+    pairs = []
+    for path in sorted(glob.glob(os.path.join(matches_dir, "*_matches.json"))):
+        with open(path, "r", encoding="utf-8") as fp:
+            pairs.append((path, os.path.join(timelines_dir, os.path.basename(path).replace("_matches", "_timeline")), json.load(fp)))
+    return pairs
+
+def run_stages(args, timer):
+    """Every stage of the pipeline, each one on the output of the one before."""
+    from static_data import get_static_data
+    from synthetic_matches import MatchGenerator, write_matches
+    from player_index import ALL_PLAYERS_PATH, PLAYER_INFO_FOLDER
+    from extract_features import extract_match_features, extract_match, extract_features, load_extraction_context
+    import timeline_dataset as td
+    import metrics
+
+    generator = MatchGenerator(get_static_data(), args.minutes, args.events_per_minute, args.item_churn)
+    tiers = timer.run("generate", "matches", write_matches, generator, args.matches,
+                      os.path.join("matches", "BENCH"), os.path.join("timelines", "BENCH"), args.seed, count=args.matches)
+    os.makedirs(PLAYER_INFO_FOLDER, exist_ok=True)
+    with open(ALL_PLAYERS_PATH, "w", encoding="utf-8") as fp:
+        json.dump({puuid: {"puuid": puuid, "tier": tier} for puuid, tier in tiers.items()}, fp)
+
+    # Built outside the timed stages, a real run reuses the index between batches
+    analysed_items, champion_name_dict = load_extraction_context()
+    pairs = load_matches(os.path.join("matches", "BENCH"), os.path.join("timelines", "BENCH"))
+    timer.run("extract_match_features", "matches",
+              lambda: [extract_match_features(match) for _, _, match in pairs], count=len(pairs))
+    results = timer.run("extract_match", "matches",
+                        lambda: [extract_match(match, timeline, analysed_items, champion_name_dict) for match, timeline, _ in pairs],
+                        count=len(pairs))
+    failed = [result[0] for result in results if result and not result[3]]
+    if failed:
+        print(f"{len(failed)} synthetic matches failed extract_match's checks, e.g. {failed[0]}")
+
+    checked = timer.run("extract_features", "matches", extract_features,
+                        os.path.join("matches", "BENCH"), os.path.join("timelines", "BENCH"), args.workers, count=len)
+    files = sorted(glob.glob(os.path.join("features", "timeline", "timeline_features_ID*")),
+                   key=lambda fn: int(os.path.basename(fn).replace("timeline_features_ID", "").split(".")[0]))
+    if not checked or not files:
+        print("No timeline features were written, skipping the dataset stages")
+        return
+
+    schema = td.load_feature_schema()
+    frames = timer.run("load_frames", "frames", td.load_frames, files, count=lambda frames: len(frames["matchId"]))
+    frames = timer.run("keep_valid_matches", "frames", td.keep_valid_matches, frames, count=len(frames["matchId"]))
+    frames = timer.run("add_stats_cols", "frames", td.add_stats_cols, frames, count=len(frames["matchId"]))
+    rows = timer.run("expand_match", "rows", td.expand_match_sparse, frames, schema, count=len)
+    if len(rows):
+        rows = timer.run("keep_high_performance", "rows", td.keep_high_performance_sparse, rows, count=len(rows))
+    dense = timer.run("to_dense", "rows", rows.to_dense, count=len(rows))
+    os.makedirs(os.path.join("features", "dataset"), exist_ok=True)
+    timer.run("write_shard", "rows", td.write_shard, os.path.join("features", "dataset", "bench.parquet"), rows, count=len(rows))
+    timer.run("build_batch", "rows", lambda: [len(td.build_batch(files[i:i + TIMELINE_BATCH_SIZE], schema, sparse=True))
+                                              for i in range(0, len(files), TIMELINE_BATCH_SIZE)], count=sum)
+    if not len(dense):
+        return
+
+    # Top 6 of random scores against the current items of each row, repeated up to args.metric_rows
+    item_ids = np.array(get_static_data().item_catalog.analysed_ids)
+    scores = np.random.default_rng(args.seed).random((len(dense), len(item_ids)), dtype=np.float32)
+    predictions = timer.run("top_k_items", "rows", metrics.top_k_items, scores, item_ids, count=len(dense))
+    labels = dense[[f"items_{i}" for i in range(td.LIST_SIZE["items"])]].to_numpy(dtype=np.int64)
+    predictions = np.resize(predictions, (args.metric_rows, predictions.shape[1]))
+    labels = np.resize(labels, (args.metric_rows, labels.shape[1]))
+    match_ids = np.resize(dense["matchId"].to_numpy(), args.metric_rows)
+    timer.run("metrics", "rows", metrics.evaluate, predictions, labels, match_ids, count=args.metric_rows)
+
+def settings(args, game_data):
+    """What a baseline has to share with a run for their timings to be compared."""
+    return {
+        "matches": args.matches,
+        "minutes": args.minutes,
+        "events_per_minute": args.events_per_minute,
+        "item_churn": args.item_churn,
+        "seed": args.seed,
+        "workers": args.workers,
+        "metric_rows": args.metric_rows,
+        "game_data": game_data,
+    }
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Stages whose throughput fell more than tolerance below the baseline, as (stage, ratio)."""
+    if baseline["settings"] != results["settings"]:
+        print(f"Baseline settings differ, not comparing:\n  baseline {baseline['settings']}\n  this run {results['settings']}")
+        return []
+    regressions = []
+    for name, stage in results["stages"].items():
+        before = baseline["stages"].get(name, {})
+        if not before.get("per_second") or not stage["per_second"]:
+            continue
+        ratio = stage["per_second"] / before["per_second"]
+        regressed = ratio < 1 - tolerance and before["seconds"] >= MIN_STAGE_SECONDS
+        status = "REGRESSION" if regressed else "ok" if before["seconds"] >= MIN_STAGE_SECONDS else "too short"
+        print(f"{name:<28}{before['per_second']:>14.1f} -> {stage['per_second']:<14.1f}{ratio:>8.2f}x  {status}")
+        if regressed:
+            regressions.append((name, ratio))
+    return regressions
+
+def main(args):
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="bench_")
+    timer = StageTimer(args.verbose)
+    try:
+        game_data = prepare_workspace(workspace, args.synthetic_data)
+        os.chdir(workspace)
+        # The copied snapshot is the flat game_data folder of the workspace
+        os.environ["GAME_DATA_VERSION"] = "local"
+        start = time.perf_counter()
+        run_stages(args, timer)
+        total = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Workspace kept in {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    timer.report()
+    print(f"Total {total:.1f}s, peak RSS {peak_rss_mb() or 0:.0f} MB")
+    results = {
+        "settings": settings(args, game_data),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "total_seconds": total,
+        "stages": timer.stages,
+    }
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=4)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=4)
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --save-baseline to create one")
+        return 0
+    with open(baseline_path, "r", encoding="utf-8") as fp:
+        baseline = json.load(fp)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} stages regressed: {', '.join(name for name, _ in regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    from synthetic_matches import MINUTES, EVENTS_PER_MINUTE, ITEM_CHURN
+    parser = ArgumentParser(description="Benchmark the pipeline stages on synthetic matches.")
+    parser.add_argument('-n', '--matches', type=int, default=MATCHES, help=f'Synthetic matches to generate (default: {MATCHES})')
+    parser.add_argument('--minutes', type=float, default=MINUTES, help=f'Average game length (default: {MINUTES})')
+    parser.add_argument('--events-per-minute', type=int, default=EVENTS_PER_MINUTE, help=f'Timeline event density (default: {EVENTS_PER_MINUTE})')
+    parser.add_argument('--item-churn', type=float, default=ITEM_CHURN, help=f'Share of sales and undone purchases (default: {ITEM_CHURN})')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Processes used by the extract_features stage (default: 1)')
+    parser.add_argument('--metric-rows', type=int, default=METRIC_ROWS, help=f'Predictions scored by the metrics stage (default: {METRIC_ROWS})')
+    parser.add_argument('--synthetic-data', action='store_true', help='Use a generated item and champion catalog even if a game data snapshot exists')
+    parser.add_argument('--baseline', type=str, default=BASELINE_PATH, help=f'Baseline results to compare with (default: {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action='store_true', help='Save this run as the baseline instead of comparing with it')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f'Slowdown allowed before a stage counts as a regression (default: {TOLERANCE})')
+    parser.add_argument('-o', '--output', type=str, help='Also write the results of this run to a JSON file')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch folder with the generated matches and features')
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    sys.exit(main(args))
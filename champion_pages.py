@@ -0,0 +1,192 @@
+import os
+import json
+import re
+import codecs
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get, CHUNK_SIZE
+
+PAGES_FOLDER = "champions_html"
+SCRAPE_WORKERS = 8
+# Read from the raw tag, the parser decodes the "&reg" of an unescaped "&region=" as an entity
+REGION_PARAM = re.compile(r"[?&;]region=([A-Za-z]+)")
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+}
+
+class BestPlayersParser(HTMLParser):
+    """
+    Candidates of a leagueofgraphs ranking page: the Riot id is the text of a
+    <span class="name">, the region is the text of the next <i>.
+    """
+    def __init__(self, server_mapping):
+        super().__init__()
+        self.server_mapping = server_mapping
+        self.players = []
+        self.player_info = None
+        self.capture = None
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "span" and "name" in (dict(attrs).get("class") or "").split():
+            self.capture = "name"
+            self.text = []
+        elif tag == "i" and not attrs and self.player_info is not None:
+            self.capture = "region"
+            self.text = []
+
+    def handle_data(self, data):
+        if self.capture:
+            self.text.append(data)
+
+    def handle_endtag(self, tag):
+        if self.capture == "name" and tag == "span":
+            player_info = "".join(self.text).strip().split("#")
+            self.player_info = player_info if len(player_info) == 2 else None
+            self.capture = None
+        elif self.capture == "region" and tag == "i":
+            region = "".join(self.text).strip()
+            if region in self.server_mapping:
+                self.players.append({
+                    'gameName': self.player_info[0],
+                    'tagLine': self.player_info[1],
+                    'region': self.server_mapping[region],
+                })
+            self.player_info = None
+            self.capture = None
+
+class MonochampionsParser(HTMLParser):
+    """
+    Candidates of a championmastery page: every link with a region in its query
+    string, whose text is the "name #tag" Riot id.
+    """
+    def __init__(self, server_mapping):
+        super().__init__()
+        self.server_mapping = server_mapping
+        self.players = []
+        self.region = None
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        region = REGION_PARAM.search(self.get_starttag_text())
+        if region:
+            self.region = region.group(1)
+            self.text = []
+
+    def handle_data(self, data):
+        if self.region is not None:
+            self.text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag != "a" or self.region is None:
+            return
+        player_info = "".join(self.text).split("#")
+        if len(player_info) == 2 and self.region in self.server_mapping:
+            self.players.append({
+                'gameName': player_info[0].strip(),
+                'tagLine': player_info[1].strip(),
+                'region': self.server_mapping[self.region],
+            })
+        self.region = None
+
+PAGE_MODES = {
+    "best": (
+        lambda champion_name, champion_id: f"https://www.leagueofgraphs.com/rankings/summoners/{champion_name.lower()}",
+        BestPlayersParser,
+        BROWSER_HEADERS,
+    ),
+    "mono": (
+        lambda champion_name, champion_id: f"https://championmastery.gg/champion?champion={champion_id}",
+        MonochampionsParser,
+        {},
+    ),
+}
+
+def page_path(mode, champion_name, folder=PAGES_FOLDER):
+    return os.path.join(folder, f"{mode}_{champion_name}.html")
+
+def feed_chunks(parser, chunks):
+    """Parse a page given as byte chunks in a single pass, returning the parser's players."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.players
+
+def parse_page(path, parser):
+    with open(path, "rb") as fp:
+        return feed_chunks(parser, iter(lambda: fp.read(CHUNK_SIZE), b""))
+
+def load_validators(path):
+    meta_path = f"{path}.meta"
+    if not os.path.exists(path) or not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+def fetch_page(mode, champion_name, champion_id, server_mapping, folder=PAGES_FOLDER):
+    """
+    Candidate players of a champion page. The page is kept in folder with its ETag and
+    Last-Modified, so later runs only download it again if the site says it changed.
+    The body is parsed while it is downloaded. Returns None if the page couldn't be fetched.
+    """
+    url_for, parser_class, headers = PAGE_MODES[mode]
+    url = url_for(champion_name, champion_id)
+    path = page_path(mode, champion_name, folder)
+    validators = load_validators(path)
+    headers = dict(headers)
+    if "etag" in validators:
+        headers["If-None-Match"] = validators["etag"]
+    if "last_modified" in validators:
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = get(url, headers=headers, stream=True)
+    with response:
+        if response.status_code == 304:
+            return parse_page(path, parser_class(server_mapping))
+        if response.status_code != 200:
+            print(f"Couldn't download from {url}")
+            return None
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fp:
+            def chunks():
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    fp.write(chunk)
+                    yield chunk
+            players = feed_chunks(parser_class(server_mapping), chunks())
+        os.replace(tmp_path, path)
+    validators = {}
+    if response.headers.get("ETag"):
+        validators["etag"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        validators["last_modified"] = response.headers["Last-Modified"]
+    with open(f"{path}.meta", "w", encoding="utf-8") as fp:
+        json.dump(validators, fp)
+    print(f"Champion HTML downloaded: {path}")
+    return players
+
+def scrape_pages(pages, server_mapping, workers=SCRAPE_WORKERS, folder=PAGES_FOLDER):
+    """
+    Fetch and parse many champion pages at once.
+    pages: (mode, champion_name, champion_id) tuples.
+    Returns {(mode, champion_name): players} for the pages that could be fetched.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            (mode, champion_name): pool.submit(fetch_page, mode, champion_name, champion_id, server_mapping, folder)
+            for mode, champion_name, champion_id in pages
+        }
+    candidates = {}
+    for key, future in futures.items():
+        try:
+            players = future.result()
+        except Exception as e:
+            print(f"Couldn't scrape {key[0]} page of {key[1]}: {e}")
+            continue
+        if players is not None:
+            candidates[key] = players
+    print(f"Scraped {len(candidates)} of {len(futures)} champion pages")
+    return candidates
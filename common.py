@@ -1,5 +1,8 @@
 import os
 import json
+import hashlib
+
+HASH_CHUNK_SIZE = 1024 ** 2
 
 def load_json(file_path):
     """Load JSON data from a file."""
@@ -13,3 +16,10 @@ def load_json(file_path):
         except json.JSONDecodeError as e:
             print(f"Error decoding JSON from {file_path}: {e}")
             return None
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
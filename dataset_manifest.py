@@ -0,0 +1,90 @@
+import os
+import json
+from common import file_hash
+
+MANIFEST_FILE = "manifest.json"
+
+class DatasetManifest:
+    """
+    Record of which timeline feature files (with their content hash) and matchIds went into
+    each dataset shard, kept as manifest.json next to the shards. Lets a build skip the
+    sources that didn't change and only rebuild the shards of the ones that did.
+    """
+    def __init__(self, out_path):
+        self.out_path = out_path
+        self.path = os.path.join(out_path, MANIFEST_FILE)
+        self.sources = {}
+        self.shards = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as fp:
+                manifest = json.load(fp)
+            self.sources = manifest["sources"]
+            self.shards = manifest["shards"]
+
+    def save(self):
+        os.makedirs(self.out_path, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({"sources": self.sources, "shards": self.shards}, fp)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, source):
+        """True if source is in a shard and its content didn't change since it was built."""
+        entry = self.sources.get(source)
+        if entry is None or entry["shard"] not in self.shards or not os.path.exists(source):
+            return False
+        stat = os.stat(source)
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        # Touched but maybe not changed, the hash decides
+        if stat.st_size == entry["size"] and file_hash(source) == entry["hash"]:
+            entry["mtime_ns"] = stat.st_mtime_ns
+            return True
+        return False
+
+    def stale_shards(self, sources):
+        """Shards with a source that is missing or changed, from the given sources or already recorded."""
+        stale = set()
+        for source, entry in self.sources.items():
+            if not os.path.exists(source):
+                stale.add(entry["shard"])
+        for source in sources:
+            entry = self.sources.get(source)
+            if entry is not None and not self.is_current(source):
+                stale.add(entry["shard"])
+        return stale
+
+    def remove_shard(self, shard):
+        info = self.shards.pop(shard, None)
+        if info is None:
+            return []
+        for source in info["sources"]:
+            self.sources.pop(source, None)
+        path = os.path.join(self.out_path, shard)
+        if os.path.exists(path):
+            os.remove(path)
+        return info["sources"]
+
+    def add_shard(self, shard, sources, match_ids, rows):
+        self.shards[shard] = {"sources": list(sources), "matchIds": sorted(match_ids), "rows": rows}
+        for source in sources:
+            stat = os.stat(source)
+            self.sources[source] = {
+                "hash": file_hash(source),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "shard": shard,
+            }
+
+    def shard_paths(self):
+        return [os.path.join(self.out_path, shard) for shard in self.shards]
+
+    def match_ids(self):
+        return {match_id for info in self.shards.values() for match_id in info["matchIds"]}
+
+    def unknown_shards(self):
+        """Parquet files in out_path that no build recorded (from before the manifest)."""
+        return sorted(
+            fn for fn in os.listdir(self.out_path)
+            if fn.endswith(".parquet") and fn not in self.shards
+        ) if os.path.isdir(self.out_path) else []
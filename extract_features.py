@@ -1,15 +1,32 @@
 import json 
 import os
-from get_game_data import get_item_data, get_champion_data
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from static_data import get_static_data
+from match_index import get_match_index, EXTRACTED
+from player_index import get_player_index
+from item_catalog import ITEM_UPGRADES, SUPPORT_QUEST_ITEM, SUPPORT_ITEMS
+from timeline_format import encode_timeline_features, write_timeline_parquet
+from timeline_stream import iter_timeline_frames, mark_last
+from match_archive import open_source, source_name, get_match_archive, archived_origins
 
 DEBUG = True
-ITEM_UPGRADES = {
-    3004: 3042, # gota ad
-    3003: 3040, # gota ap
-    3119: 3121, # gota tank
-    3010: 3013, # bota void
-    3866: 3867, # item de sup
-}
+# "compact" stores static participant info once per match (see timeline_format), "json" keeps full frame dicts
+# and "parquet" writes one typed row per (match, timeframe, participant)
+TIMELINE_FORMATS = ["compact", "json", "parquet"]
+TIMELINE_FORMAT = "compact"
+# Matches per written features file
+BATCH_SIZE = 50
+# Fetched matches waiting for ExtractionPipeline before the crawler blocks
+PIPELINE_QUEUE_SIZE = 200
+_FLUSH = object()
+PARTICIPANT_IDS = frozenset(range(1, 11))
+ITEM_EVENTS = frozenset(["ITEM_PURCHASED", "ITEM_SOLD", "ITEM_UNDO", "ITEM_DESTROYED"])
 LANE_ORDER = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
 ELITE_MONSTER_MAPPING = {
     "DRAGON": "dragonKills",
@@ -19,33 +36,32 @@ ELITE_MONSTER_MAPPING = {
     "ATAKHAN": "atakhanKills",
 }
 
-def write_to_files(all_timeline_features, all_postgame_features, checked):
+def write_to_files(all_timeline_features, all_postgame_features, timeline_format=TIMELINE_FORMAT):
     timeline_folder = os.path.join("features", "timeline")
     postgame_folder = os.path.join("features", "postgame")
-    checked_folder = os.path.join("features")
     os.makedirs(timeline_folder, exist_ok=True)
     os.makedirs(postgame_folder, exist_ok=True)
-    os.makedirs(checked_folder, exist_ok=True)
 
     ids = [int(fn[fn.find("ID")+2:fn.find(".")]) for fn in os.listdir(timeline_folder) if "features_ID" in fn]
     new_id = max(ids) + 1 if ids else 0
 
-    timeline_filepath = os.path.join(timeline_folder, f"timeline_features_ID{new_id}.json")
+    extension = "parquet" if timeline_format == "parquet" else "json"
+    timeline_filepath = os.path.join(timeline_folder, f"timeline_features_ID{new_id}.{extension}")
     postgame_filepath = os.path.join(postgame_folder, f"postgame_features_ID{new_id}.json")
-    checked_filepath  = os.path.join(checked_folder, "checked.json")
 
-    with open(timeline_filepath, "w+", encoding="utf-8") as fp:
-        json.dump(all_timeline_features, fp, ensure_ascii=False, indent=4)
+    if timeline_format == "parquet":
+        write_timeline_parquet(timeline_filepath, all_timeline_features)
+    else:
+        with open(timeline_filepath, "w+", encoding="utf-8") as fp:
+            if timeline_format == "compact":
+                json.dump(encode_timeline_features(all_timeline_features), fp, ensure_ascii=False, separators=(",", ":"))
+            else:
+                json.dump(all_timeline_features, fp, ensure_ascii=False, indent=4)
     with open(postgame_filepath, "w+", encoding="utf-8") as fp:
         json.dump(all_postgame_features, fp, ensure_ascii=False, indent=4)
 
-    if os.path.exists(checked_filepath):
-        with open(checked_filepath, "r") as fp:
-            prev_checked = json.load(fp)
-            checked = list(set(checked).union(prev_checked))
-    with open(checked_filepath, "w+") as fp:
-        json.dump(checked, fp, ensure_ascii=False, indent=4)
-    return checked
+    # Only marked once their features are on disk
+    get_match_index().mark(list(all_timeline_features.keys()), EXTRACTED)
 
 def extract_match_features(match_details):
     info = match_details.get("info", {})
@@ -80,39 +96,259 @@ def extract_match_features(match_details):
     return features
 
 ## Funcao gigante pq eu tava com preguica
-def extract_features(matches_dir, timelines_dir):
-    checked_path = os.path.join("features", "checked.json")
-    if os.path.exists(checked_path):
-        with open(checked_path, "r") as fp:
-            checked = json.load(fp)
-    else:
-        checked = []
+def extract_match(match, timeline, analysed_items, champion_name_dict):
+    """Replay a single match timeline, returning (match_id, postgame, frames, ok, debug_string)."""
+    with open_source(match) as fp:
+        match_details = json.load(fp)
+
+    print(source_name(match))
+    match_features = extract_match_features(match_details)
+
+    match_id = match_details["metadata"]["matchId"]
+
+    if not match_features:
+        return None
+
+    tier = get_player_index().first_tier([player["puuid"] for player in match_features])
+    for player in match_features:
+        player["tier"] = tier
+
+    # Add nome do champ nas features
+    for participant_info in match_features:
+        participant_info["championName"] = champion_name_dict[participant_info["championId"]]
+        participant_info["items"] = [item for item in participant_info["items"] if item in analysed_items]
+
+    match_results = {
+        participant_info["participantId"]: participant_info
+        for participant_info in match_features
+    }
+
+    additional_features = {
+        participant_info["participantId"]: {
+            feature: participant_info[feature]
+            for feature in [
+                "participantId",
+                "puuid",
+                "championId",
+                "teamId",
+                "lane",
+                "perks",
+                "tier",
+                "championName",
+                "origin",
+            ]
+        } for participant_info in match_features
+    }
+
+    all_ids = [match_dict["participantId"] for match_dict in match_features]
+    team_id = {participant_id: match_results[participant_id]["teamId"] for participant_id in all_ids}
+
+    # Frames are parsed one at a time, with only the fields and events used below
+    frames = iter_timeline_frames(timeline, opener=open_source)
+    all_frames = {
+        -1: {
+            participantId: {
+                "kills": 0,
+                "deaths": 0,
+                "assists": 0,
+                "items": [],
+                "currentGold": 0,
+                "goldEarned": 0,
+                "skills": [0, 0, 0, 0],
+                "level": 0,
+                "minionsKilled": 0,
+                "dragonKills": 0,
+                "voidgrubKills": 0,
+                "heraldKills": 0,
+                "baronKills": 0,
+                "atakhanKills": 0,
+                "structuresKilled": 0,
+                **additional_features[participantId]
+            }
+            for participantId in all_ids
+        }
+    }
+    marked_for_removal = [-1, ]
+    timestamp = -1
+
+    for frame, is_last_frame in mark_last(frames):
+
+        frame_features = {
+            participantId: {
+                "kills": all_frames[timestamp][participantId]["kills"],
+                "deaths": all_frames[timestamp][participantId]["deaths"],
+                "assists": all_frames[timestamp][participantId]["assists"],
+                "items":  all_frames[timestamp][participantId]["items"].copy(),
+                "skills": all_frames[timestamp][participantId]["skills"].copy(),
+                "currentGold": all_frames[timestamp][participantId]["currentGold"],
+                "goldEarned": all_frames[timestamp][participantId]["goldEarned"],
+                "level": all_frames[timestamp][participantId]["level"],
+                "minionsKilled": all_frames[timestamp][participantId]["minionsKilled"],
+                "dragonKills": all_frames[timestamp][participantId]["dragonKills"],
+                "voidgrubKills": all_frames[timestamp][participantId]["voidgrubKills"],
+                "baronKills": all_frames[timestamp][participantId]["baronKills"],
+                "heraldKills": all_frames[timestamp][participantId]["heraldKills"],
+                "atakhanKills": all_frames[timestamp][participantId]["atakhanKills"],
+                "structuresKilled": all_frames[timestamp][participantId]["structuresKilled"],
+                "boughtItem": False,
+                **additional_features[participantId]
+            }
+            for participantId in all_ids
+        }
+
+        participantFrames = frame.get("participantFrames", {})
+        # dados sempre presentes
+        for participant_str_id in participantFrames.keys():
+            frame_features[int(participant_str_id)]["currentGold"] = \
+                participantFrames[participant_str_id]["currentGold"]
+            frame_features[int(participant_str_id)]["goldEarned"] = \
+                participantFrames[participant_str_id]["totalGold"]
+            frame_features[int(participant_str_id)]["level"] = \
+                participantFrames[participant_str_id]["level"]
+            frame_features[int(participant_str_id)]["minionsKilled"] = \
+                participantFrames[participant_str_id]["minionsKilled"] + \
+                participantFrames[participant_str_id]["jungleMinionsKilled"]
+
+        events = frame.get("events", {})
+        timestamp = frame.get("timestamp", {})
+        must_keep = False
+        for event in events:
+            bought_item = False
+            # item
+            if event["type"] in ITEM_EVENTS and \
+                    event.get("participantId", 0) not in PARTICIPANT_IDS:
+                continue
+
+            if event["type"] == "ITEM_PURCHASED" and event["itemId"] in analysed_items:
+                if event["itemId"] not in frame_features[event["participantId"]]["items"]:
+                    frame_features[event["participantId"]]["items"].append(event["itemId"])
+                    bought_item = True
+
+            elif event["type"] == "ITEM_SOLD" and event["itemId"] in analysed_items:
+                if event["itemId"] in frame_features[event["participantId"]]["items"]:
+                    frame_features[event["participantId"]]["items"].remove(event["itemId"])
+
+            elif event["type"] == "ITEM_UNDO":
+                # Desfez compra
+                if event["beforeId"] in frame_features[event["participantId"]]["items"]:
+                    frame_features[event["participantId"]]["items"].remove(event["beforeId"])
+
+                # Desfez venda
+                if event["afterId"] in analysed_items:  
+                    if event["afterId"] not in frame_features[event["participantId"]]["items"]:
+                        frame_features[event["participantId"]]["items"].append(event["afterId"])
+                    else:
+                        frame_features[event["participantId"]]["items"].remove(event["afterId"])
 
-    item_path = get_item_data(clean=False)
-    champion_path = get_champion_data(clean=False)
+            elif event["type"] == "ITEM_DESTROYED" and event["itemId"] in analysed_items:
+                # Remocao
+                if event["itemId"] in frame_features[event["participantId"]]["items"] and \
+                        match_results[event["participantId"]]["championName"].lower() not in ["viego"]:
+                    frame_features[event["participantId"]]["items"].remove(event["itemId"])
 
-    with open(item_path, "r", encoding="utf-8") as fp:
-        info = json.load(fp)
-        analysed_items = [
-            info[str_id]["id"] for str_id in info.keys()
-            if info[str_id]["tier"] >= 3 or (info[str_id]["tier"] == 2 and \
-                ("BOOTS" in info[str_id]["rank"] or info[str_id]["id"] in ITEM_UPGRADES)) or \
-                ("STARTER" in info[str_id]["rank"])
-        ]
+                # Item com upgrade
+                if event["itemId"] in ITEM_UPGRADES:
+                    frame_features[event["participantId"]]["items"].append(ITEM_UPGRADES[event["itemId"]])
 
-    with open(champion_path, "r", encoding="utf-8") as fp:
-        info = json.load(fp)
-        champion_name_dict = {info[champ]["id"]: champ for champ in info.keys()}
+                # Item de suporte
+                if event["itemId"] == SUPPORT_QUEST_ITEM:
+                    for item in SUPPORT_ITEMS:
+                        if item in match_results[event["participantId"]]["items"] and \
+                                item not in frame_features[event["participantId"]]["items"]:
+                            frame_features[event["participantId"]]["items"].append(item)
+                            bought_item = True
 
-    all_timeline_features = {}
-    all_postgame_features = {}
+            if bought_item:
+                frame_features[event["participantId"]]["boughtItem"] = bought_item
+                must_keep = True
+                continue
+
+            if event["type"] == "CHAMPION_KILL":
+                # kill
+                if event["killerId"] in PARTICIPANT_IDS:
+                    frame_features[event["killerId"]]["kills"] += 1
+
+                # death
+                frame_features[event["victimId"]]["deaths"] += 1
+
+                # assist
+                if "assistingParticipantIds" in event:
+                    for assistant_id in event["assistingParticipantIds"]:
+                        frame_features[assistant_id]["assists"] += 1
+
+            elif event["type"] == "SKILL_LEVEL_UP":
+                # kill
+                frame_features[event["participantId"]]["skills"][event["skillSlot"] - 1] += 1
+
+            elif event["type"] == "ELITE_MONSTER_KILL":
+                for participantId in frame_features.keys():
+                    if frame_features[participantId]["teamId"] == event["killerTeamId"]:
+                        frame_features[participantId][ELITE_MONSTER_MAPPING[event["monsterType"]]] += 1
+
+            elif event["type"] == "BUILDING_KILL":
+                for participantId in frame_features.keys():
+                    if frame_features[participantId]["teamId"] != event["teamId"]:
+                        frame_features[participantId]["structuresKilled"] += 1
+
+        all_frames[timestamp] = frame_features
+
+        if not (must_keep or is_last_frame):
+            marked_for_removal.append(timestamp)
+
+    for ts in marked_for_removal:
+        all_frames.pop(ts)
+
+    last_frame = all_frames[max(all_frames.keys())]
+
+    debug_string = ""
+
+    features = []
+    for feat in last_frame[1].keys():
+        if feat in match_results[1]:
+            features.append(feat)
+        else:
+            debug_string += f"Feature {feat} not found in postgame results\n"
+
+    ok = True
+    mistakes = 0
+    for i, participantId in enumerate(sorted(all_ids, key=lambda x: team_id[x])):
+        single_ok = True
+        if i == 0 or i == 5:
+            debug_string += f"\nTime {i % 2}\n"
+        debug_string += f"Participant {participantId} - {match_results[participantId]['championName']}\n"
+        for feat in features:
+            try:
+                if feat != "items":
+                    assert match_results[participantId][feat] == last_frame[participantId][feat]
+                else:
+                    if match_results[participantId]["championName"] != "Viego":
+                        for item in match_results[participantId][feat]:
+                            if item not in last_frame[participantId][feat]:
+                                mistakes += 1
+                        for item in last_frame[participantId][feat]:
+                            if item not in match_results[participantId][feat]:
+                                mistakes += 1
+                    assert mistakes < 3
+            except:
+                debug_string += f"Feature: {feat:<20} Match results: {str(match_results[participantId][feat]):<50} Timeline: {str(last_frame[participantId][feat])}\n"
+                ok = single_ok = False
+        debug_string += f"{'OK' if single_ok else '** FAILED **'}\n"
+
+    if not ok:
+        debug_string += f"Error found in match: {source_name(timeline)}\n"
+    return match_id, match_features, all_frames, ok, debug_string
+
+def extract_features(matches_dir, timelines_dir, workers=1, timeline_format=TIMELINE_FORMAT):
+    """Extract the matches stored as one JSON file per match in matches_dir and timelines_dir."""
+    match_index = get_match_index()
+    pending = []
 
     for match_json in os.listdir(matches_dir):
         if not os.path.exists(os.path.join(matches_dir, match_json)):
             continue
 
         match_id = match_json.split("_matches")[0]
-        if match_id in checked:
+        if match_index.is_extracted(match_id):
             print(f"Already checked: {match_id}")
             continue
 
@@ -121,277 +357,193 @@ def extract_features(matches_dir, timelines_dir):
             continue
 
         match = os.path.join(matches_dir, match_json)
+        pending.append((match, timeline))
 
-        with open(timeline, "r", encoding="utf-8") as fp:
-            timeline_details = json.load(fp)
-
-        with open(match, "r", encoding="utf-8") as fp:
-            match_details = json.load(fp)
-
-        print(match_json)
-        match_features = extract_match_features(match_details)
+    return extract_pending(pending, workers, timeline_format)
 
-        match_id = match_details["metadata"]["matchId"]
-
-        if not match_features:
+def extract_archived_features(archive, workers=1, timeline_format=TIMELINE_FORMAT):
+    """Extract the matches stored in a MatchArchive, reading its segments in write order."""
+    match_index = get_match_index()
+    pending = []
+    for match_ref, timeline_ref in archive.pairs():
+        if match_index.is_extracted(match_ref.match_id):
+            print(f"Already checked: {match_ref.match_id}")
             continue
+        pending.append((match_ref, timeline_ref))
+    return extract_pending(pending, workers, timeline_format)
+
+def load_extraction_context():
+    """(analysed_items, champion_name_dict) passed to extract_match."""
+    # Built once here, so worker processes only open their own connection to it
+    get_player_index()
+
+    static_data = get_static_data()
+    return static_data.item_catalog.analysed, static_data.champion_id_to_name
+
+def init_extraction_worker():
+    """Open the player index in the worker's own process, before its first match."""
+    get_player_index()
+
+def extraction_executor(workers):
+    # Spawned rather than forked: the crawler's threads, locks and SQLite connections are not copied into the workers
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_extraction_worker,
+    )
+
+def extract_pending(pending, workers=1, timeline_format=TIMELINE_FORMAT):
+    """Extract (match, timeline) pairs, each given as a file path or an archive RecordRef."""
+    checked = []
+    analysed_items, champion_name_dict = load_extraction_context()
 
-        tier = None
-        with open(os.path.join("player_info", "all_players.json"), "r", encoding="UTF-8") as fp:
-            all_players = json.load(fp)
-            for player in match_features:
-                if player["puuid"] in all_players:
-                    tier = all_players[player["puuid"]]["tier"]
-                    break
-        for player in match_features:
-            player["tier"] = tier
-
-        all_postgame_features[match_id] = match_features
-
-
-        # Add nome do champ nas features
-        for participant_info in match_features:
-            participant_info["championName"] = champion_name_dict[participant_info["championId"]]
-            participant_info["items"] = [item for item in participant_info["items"] if item in analysed_items]
-
-        match_results = {
-            participant_info["participantId"]: participant_info
-            for participant_info in match_features
-        }
-
-        additional_features = {
-            participant_info["participantId"]: {
-                feature: participant_info[feature]
-                for feature in [
-                    "participantId",
-                    "puuid",
-                    "championId",
-                    "teamId",
-                    "lane",
-                    "perks",
-                    "tier",
-                    "championName",
-                    "origin",
-                ]
-            } for participant_info in match_features
-        }
-
-        all_ids = [match_dict["participantId"] for match_dict in match_features]
-        team_id = {participant_id: match_results[participant_id]["teamId"] for participant_id in all_ids}
-
-        frames = timeline_details.get("info", {}).get("frames", {})
-        all_frames = {
-            -1: {
-                participantId: {
-                    "kills": 0,
-                    "deaths": 0,
-                    "assists": 0,
-                    "items": [],
-                    "currentGold": 0,
-                    "goldEarned": 0,
-                    "skills": [0, 0, 0, 0],
-                    "level": 0,
-                    "minionsKilled": 0,
-                    "dragonKills": 0,
-                    "voidgrubKills": 0,
-                    "heraldKills": 0,
-                    "baronKills": 0,
-                    "atakhanKills": 0,
-                    "structuresKilled": 0,
-                    **additional_features[participantId]
-                }
-                for participantId in all_ids
-            }
-        }
-        marked_for_removal = [-1, ]
-        timestamp = -1
-
-        for i, frame in enumerate(frames):
-
-            frame_features = {
-                participantId: {
-                    "kills": all_frames[timestamp][participantId]["kills"],
-                    "deaths": all_frames[timestamp][participantId]["deaths"],
-                    "assists": all_frames[timestamp][participantId]["assists"],
-                    "items":  all_frames[timestamp][participantId]["items"].copy(),
-                    "skills": all_frames[timestamp][participantId]["skills"].copy(),
-                    "currentGold": all_frames[timestamp][participantId]["currentGold"],
-                    "goldEarned": all_frames[timestamp][participantId]["goldEarned"],
-                    "level": all_frames[timestamp][participantId]["level"],
-                    "minionsKilled": all_frames[timestamp][participantId]["minionsKilled"],
-                    "dragonKills": all_frames[timestamp][participantId]["dragonKills"],
-                    "voidgrubKills": all_frames[timestamp][participantId]["voidgrubKills"],
-                    "baronKills": all_frames[timestamp][participantId]["baronKills"],
-                    "heraldKills": all_frames[timestamp][participantId]["heraldKills"],
-                    "atakhanKills": all_frames[timestamp][participantId]["atakhanKills"],
-                    "structuresKilled": all_frames[timestamp][participantId]["structuresKilled"],
-                    "boughtItem": False,
-                    **additional_features[participantId]
-                }
-                for participantId in all_ids
-            }
+    all_timeline_features = {}
+    all_postgame_features = {}
 
-            participantFrames = frame.get("participantFrames", {})
-            # dados sempre presentes
-            for participant_str_id in participantFrames.keys():
-                frame_features[int(participant_str_id)]["currentGold"] = \
-                    participantFrames[participant_str_id]["currentGold"]
-                frame_features[int(participant_str_id)]["goldEarned"] = \
-                    participantFrames[participant_str_id]["totalGold"]
-                frame_features[int(participant_str_id)]["level"] = \
-                    participantFrames[participant_str_id]["level"]
-                frame_features[int(participant_str_id)]["minionsKilled"] = \
-                    participantFrames[participant_str_id]["minionsKilled"] + \
-                    participantFrames[participant_str_id]["jungleMinionsKilled"]
-
-            events = frame.get("events", {})
-            timestamp = frame.get("timestamp", {})
-            must_keep = False
-            for event in events:
-                bought_item = False
-                # item
-                if event["type"] in ["ITEM_PURCHASED", "ITEM_SOLD", "ITEM_UNDO", "ITEM_DESTROYED"] and \
-                        event.get("participantId", 0) not in range(1, 11):
-                    continue
-
-                if event["type"] == "ITEM_PURCHASED" and event["itemId"] in analysed_items:
-                    if event["itemId"] not in frame_features[event["participantId"]]["items"]:
-                        frame_features[event["participantId"]]["items"].append(event["itemId"])
-                        bought_item = True
-
-                elif event["type"] == "ITEM_SOLD" and event["itemId"] in analysed_items:
-                    if event["itemId"] in frame_features[event["participantId"]]["items"]:
-                        frame_features[event["participantId"]]["items"].remove(event["itemId"])
-
-                elif event["type"] == "ITEM_UNDO":
-                    # Desfez compra
-                    if event["beforeId"] in frame_features[event["participantId"]]["items"]:
-                        frame_features[event["participantId"]]["items"].remove(event["beforeId"])
-
-                    # Desfez venda
-                    if event["afterId"] in analysed_items:  
-                        if event["afterId"] not in frame_features[event["participantId"]]["items"]:
-                            frame_features[event["participantId"]]["items"].append(event["afterId"])
-                        else:
-                            frame_features[event["participantId"]]["items"].remove(event["afterId"])
-
-                elif event["type"] == "ITEM_DESTROYED" and event["itemId"] in analysed_items:
-                    # Remocao
-                    if event["itemId"] in frame_features[event["participantId"]]["items"] and \
-                            match_results[event["participantId"]]["championName"].lower() not in ["viego"]:
-                        frame_features[event["participantId"]]["items"].remove(event["itemId"])
-
-                    # Item com upgrade
-                    if event["itemId"] in ITEM_UPGRADES:
-                        frame_features[event["participantId"]]["items"].append(ITEM_UPGRADES[event["itemId"]])
-
-                    # Item de suporte
-                    if event["itemId"] == 3867:
-                        for item in [3869, 3870, 3871, 3876, 3877]:
-                            if item in match_results[event["participantId"]]["items"] and \
-                                    item not in frame_features[event["participantId"]]["items"]:
-                                frame_features[event["participantId"]]["items"].append(item)
-                                bought_item = True
-
-                if bought_item:
-                    frame_features[event["participantId"]]["boughtItem"] = bought_item
-                    must_keep = True
-                    continue
-
-                if event["type"] == "CHAMPION_KILL":
-                    # kill
-                    if event["killerId"] in range(1, 11):
-                        frame_features[event["killerId"]]["kills"] += 1
-
-                    # death
-                    frame_features[event["victimId"]]["deaths"] += 1
-
-                    # assist
-                    if "assistingParticipantIds" in event:
-                        for assistant_id in event["assistingParticipantIds"]:
-                            frame_features[assistant_id]["assists"] += 1
-
-                elif event["type"] == "SKILL_LEVEL_UP":
-                    # kill
-                    frame_features[event["participantId"]]["skills"][event["skillSlot"] - 1] += 1
-
-                elif event["type"] == "ELITE_MONSTER_KILL":
-                    for participantId in frame_features.keys():
-                        if frame_features[participantId]["teamId"] == event["killerTeamId"]:
-                            frame_features[participantId][ELITE_MONSTER_MAPPING[event["monsterType"]]] += 1
-
-                elif event["type"] == "BUILDING_KILL":
-                    for participantId in frame_features.keys():
-                        if frame_features[participantId]["teamId"] != event["teamId"]:
-                            frame_features[participantId]["structuresKilled"] += 1
-
-            all_frames[timestamp] = frame_features
-
-            is_last_frame = True if i == len(frames) - 1 else False
-            if not (must_keep or is_last_frame):
-                marked_for_removal.append(timestamp)
-
-        for ts in marked_for_removal:
-            all_frames.pop(ts)
-
-        last_frame = all_frames[max(all_frames.keys())]
-
-        debug_string = ""
-
-        features = []
-        for feat in last_frame[1].keys():
-            if feat in match_results[1]:
-                features.append(feat)
-            else:
-                debug_string += f"Feature {feat} not found in postgame results\n"
-
-        ok = True
-        mistakes = 0
-        for i, participantId in enumerate(sorted(all_ids, key=lambda x: team_id[x])):
-            single_ok = True
-            if i == 0 or i == 5:
-                debug_string += f"\nTime {i % 2}\n"
-            debug_string += f"Participant {participantId} - {match_results[participantId]['championName']}\n"
-            for feat in features:
-                try:
-                    if feat != "items":
-                        assert match_results[participantId][feat] == last_frame[participantId][feat]
-                    else:
-                        if match_results[participantId]["championName"] != "Viego":
-                            for item in match_results[participantId][feat]:
-                                if item not in last_frame[participantId][feat]:
-                                    mistakes += 1
-                            for item in last_frame[participantId][feat]:
-                                if item not in match_results[participantId][feat]:
-                                    mistakes += 1
-                        assert mistakes < 3
-                except:
-                    debug_string += f"Feature: {feat:<20} Match results: {str(match_results[participantId][feat]):<50} Timeline: {str(last_frame[participantId][feat])}\n"
-                    ok = single_ok = False
-            debug_string += f"{'OK' if single_ok else '** FAILED **'}\n"
-
-        if not ok and DEBUG:
-            debug_string += f"Error found in match: {timeline}\n"
-            print(debug_string)
-            break
-
-        all_timeline_features[match_id] = all_frames
-        checked.append(match_id)
-
-        if len(all_timeline_features) >= 50:
-            checked = write_to_files(all_timeline_features, all_postgame_features, checked)
-            all_timeline_features = {}
-            all_postgame_features = {}
+    if workers > 1:
+        # Each match is independent, results are still consumed in listing order
+        executor = extraction_executor(workers)
+        extract = partial(extract_match, analysed_items=analysed_items, champion_name_dict=champion_name_dict)
+        results = executor.map(extract, *zip(*pending), chunksize=8) if pending else []
+    else:
+        executor = None
+        results = (
+            extract_match(match, timeline, analysed_items, champion_name_dict)
+            for match, timeline in pending
+        )
+
+    try:
+        for result in results:
+            if result is None:
+                continue
+            match_id, match_features, all_frames, ok, debug_string = result
+            all_postgame_features[match_id] = match_features
+
+            if not ok and DEBUG:
+                print(debug_string)
+                break
+
+            all_timeline_features[match_id] = all_frames
+            checked.append(match_id)
+
+            if len(all_timeline_features) >= BATCH_SIZE:
+                write_to_files(all_timeline_features, all_postgame_features, timeline_format)
+                all_timeline_features = {}
+                all_postgame_features = {}
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
     if all_timeline_features:
-        checked = write_to_files(all_timeline_features, all_postgame_features, checked)
+        write_to_files(all_timeline_features, all_postgame_features, timeline_format)
 
     return checked
 
+class ExtractionPipeline:
+    """
+    Extracts matches while they are still being fetched: the crawler submits (match, timeline)
+    pairs to a bounded queue and a consumer thread extracts them (in a process pool when
+    workers > 1), writing features every BATCH_SIZE matches. A full queue blocks submit,
+    so fetching never gets too far ahead of extraction.
+    """
+    def __init__(self, workers=1, timeline_format=TIMELINE_FORMAT, queue_size=PIPELINE_QUEUE_SIZE):
+        self.analysed_items, self.champion_name_dict = load_extraction_context()
+        self.timeline_format = timeline_format
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.executor = extraction_executor(workers) if workers > 1 else None
+        self.max_in_flight = 2 * workers
+        self.checked = []
+        self.consumer = threading.Thread(target=self._consume, daemon=True)
+        self.consumer.start()
+
+    def submit(self, match, timeline):
+        self.queue.put((match, timeline))
+
+    def drain(self):
+        """Wait until every match submitted so far has its features written."""
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self):
+        self.drain()
+        self.queue.put(None)
+        self.consumer.join()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _consume(self):
+        in_flight = deque()
+        all_timeline_features = {}
+        all_postgame_features = {}
+
+        def collect(result):
+            if result is None:
+                return
+            match_id, match_features, all_frames, ok, debug_string = result
+            all_postgame_features[match_id] = match_features
+            if not ok and DEBUG:
+                # Left as fetched, the crawl keeps going
+                print(debug_string)
+                return
+            all_timeline_features[match_id] = all_frames
+            self.checked.append(match_id)
+            if len(all_timeline_features) >= BATCH_SIZE:
+                flush()
+
+        def flush():
+            if all_timeline_features:
+                write_to_files(all_timeline_features, all_postgame_features, self.timeline_format)
+            all_timeline_features.clear()
+            all_postgame_features.clear()
+
+        def finish_oldest():
+            match, future = in_flight.popleft()
+            try:
+                collect(future.result())
+            except Exception as e:
+                print(f"Error when extracting {source_name(match)}: {e}")
+            self.queue.task_done()
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            if item is _FLUSH:
+                while in_flight:
+                    finish_oldest()
+                flush()
+                self.queue.task_done()
+                continue
+            match, timeline = item
+            if self.executor is None:
+                try:
+                    collect(extract_match(match, timeline, self.analysed_items, self.champion_name_dict))
+                except Exception as e:
+                    print(f"Error when extracting {source_name(match)}: {e}")
+                self.queue.task_done()
+                continue
+            in_flight.append((match, self.executor.submit(
+                extract_match, match, timeline, self.analysed_items, self.champion_name_dict
+            )))
+            # Results are written in submission order
+            while len(in_flight) > self.max_in_flight or (in_flight and in_flight[0][1].done()):
+                finish_oldest()
+
 if __name__ == "__main__":
-    for folder in os.listdir("matches"):
+    parser = ArgumentParser(description="Extract features from the downloaded matches.")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of processes extracting matches in parallel (default: 1)')
+    parser.add_argument('-f', '--format', choices=TIMELINE_FORMATS, default=TIMELINE_FORMAT, help=f'Timeline features output format (default: {TIMELINE_FORMAT})')
+    args = parser.parse_args()
+
+    # Matches saved as separate files by older versions of get_matches
+    for folder in os.listdir("matches") if os.path.isdir("matches") else []:
         if len(os.listdir(os.path.join("matches", folder))) > 0:
             extract_features(
                 os.path.join("matches", folder),
                 os.path.join("timelines", folder),
-            )
\ No newline at end of file
+                workers=args.workers,
+                timeline_format=args.format,
+            )
+    for origin in archived_origins():
+        extract_archived_features(get_match_archive(origin), workers=args.workers, timeline_format=args.format)
\ No newline at end of file
@@ -1,20 +1,20 @@
 import json
-import wget
-import requests
 import os
+from http_client import download, get
 
-def get_champion_data(clean=True):
+def get_champion_data(clean=True, folder="game_data"):
     information_to_keep = ["id", "icon"]
     url = "https://cdn.merakianalytics.com/riot/lol/resources/latest/en-US/champions.json"
-    path = os.path.join("game_data", "champions.json")
+    path = os.path.join(folder, "champions.json")
     if os.path.exists(path):
         if clean:
             os.remove(path)
         else:
             return path
     print(f"\nFetching champions")
-    wget.download(url, out=path)
-    os.makedirs(os.sep.join(path.split(os.sep)[:-1]), exist_ok=True)
+    if not download(url, path):
+        print(f"Couldn't download from {url}")
+        return None
     with open(path, 'r', encoding='utf-8') as fp:
         champ_info = json.load(fp)
         champ_info = {
@@ -28,18 +28,19 @@ def get_champion_data(clean=True):
         json.dump(champ_info, fp, ensure_ascii=False, indent=4)
     return path
 
-def get_item_data(clean=True):
+def get_item_data(clean=True, folder="game_data"):
     information_to_keep = ["id", "name", "tier", "rank", "buildsFrom", "buildsInto", "icon"]
     url = f"https://cdn.merakianalytics.com/riot/lol/resources/latest/en-US/items.json"
-    path = os.path.join("game_data", "items.json")
+    path = os.path.join(folder, "items.json")
     if os.path.exists(path):
         if clean:
             os.remove(path)
         else:
             return path
     print(f"\nFetching items")
-    wget.download(url, out=path)
-    os.makedirs(os.sep.join(path.split(os.sep)[:-1]), exist_ok=True)
+    if not download(url, path):
+        print(f"Couldn't download from {url}")
+        return None
     with open(path, 'r', encoding='utf-8') as fp:
         item_info = json.load(fp)
         item_info = {
@@ -53,9 +54,9 @@ def get_item_data(clean=True):
         json.dump(item_info, fp, ensure_ascii=False, indent=4)
     return path
 
-def get_rune_data(clean=True):
+def get_rune_data(clean=True, folder="game_data"):
     url = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/perks.json"
-    path = os.path.join("game_data", "perks.json")
+    path = os.path.join(folder, "perks.json")
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
     }
@@ -65,7 +66,7 @@ def get_rune_data(clean=True):
         else:
             return path
     print(f"\nFetching perks (runes)")
-    response = requests.get(url, headers=headers)
+    response = get(url, headers=headers)
     if response.status_code != 200:
         return None
     perk_info  = response.json()
@@ -79,13 +80,20 @@ def get_rune_data(clean=True):
         json.dump(perk_info, fp, ensure_ascii=False, indent=4)
     return path
 
-def get_champion_icons():
-    pass
+def get_champion_icons(version=None, atlas=True):
+    """Download every champion icon of a patch into its snapshot, packed into an atlas."""
+    from icons import prefetch_icons, CHAMPIONS
+    return prefetch_icons(CHAMPIONS, version, atlas=atlas)
 
-def get_item_icons():
-    pass
+def get_item_icons(version=None, atlas=True):
+    """Download every item icon of a patch into its snapshot, packed into an atlas."""
+    from icons import prefetch_icons, ITEMS
+    return prefetch_icons(ITEMS, version, atlas=atlas)
 
 if __name__ == "__main__":
-    get_rune_data()
-    get_champion_data()
-    get_item_data()
\ No newline at end of file
+    from static_data import update_snapshot
+    version = update_snapshot()
+    if version:
+        get_champion_icons(version)
+        get_item_icons(version)
+        print(f"Game data is at patch {version}")
\ No newline at end of file
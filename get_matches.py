@@ -1,9 +1,18 @@
 import os
 import json
+import queue
+import threading
+from collections import namedtuple
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from common import load_json
 from api import make_request
-from extract_features import extract_features
-from get_game_data import get_champion_data
+from http_client import mount_host
+from extract_features import extract_features, extract_archived_features, extract_match_features, ExtractionPipeline
+from match_archive import get_match_archive, MATCH, TIMELINE
+from static_data import get_static_data
+from player_index import load_player_file
+from match_index import get_match_index, FETCHED, EXTRACTED, INVALID, OUTDATED
 import shutil
 
 """
@@ -22,8 +31,6 @@ def get_match_ids(puuid, region, step, count=20):
     return response.json()
 
 def get_match_details(match_id, region):
-    if os.path.exists(f"matches/{match_id}_matches.json"):
-        return None
     url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
     response = make_request(url)
     if response.status_code != 200:
@@ -61,23 +68,20 @@ def write_matches_anterior(champion, match_details, match_timelines):
         json.dump(match_details, file, ensure_ascii=False, indent=4)
 
 def write_match(champion, match_details, match_timeline):
-    os.makedirs(f"matches/{champion}", exist_ok=True)
-    os.makedirs(f"timelines/{champion}", exist_ok=True)
     match_id = match_details.get("metadata", {}).get("matchId", "unknown")
-
-    match_file_path = f"matches/{champion}/{match_id}_matches.json"
-    timeline_file_path = f"timelines/{champion}/{match_id}_timeline.json"
-
-    with open(match_file_path, 'w', encoding='utf-8') as file:
-        json.dump(match_details, file, ensure_ascii=False, indent=4)
-
-    if match_timeline:
-        with open(timeline_file_path, 'w', encoding='utf-8') as file:
-            json.dump(match_timeline, file, ensure_ascii=False, indent=4)
+    # Appended to the packed archive of the origin instead of two JSON files per match
+    get_match_archive(champion).append(match_id, match_details, match_timeline)
+    return match_id
 
 def delete_files(champion):
+    # Whole segments are moved to backup/ (or deleted), not one file per match
+    get_match_archive(champion).rotate()
+
+    # Files written before the archive existed
     tl_path = os.path.join("timelines", champion)
     pg_path = os.path.join("matches", champion)
+    if not os.path.isdir(tl_path) or not os.path.isdir(pg_path):
+        return
     backup = True
     if os.path.exists("backup") and os.path.isdir("backup"):
         os.makedirs(os.path.join("backup", pg_path), exist_ok=True)
@@ -90,6 +94,16 @@ def delete_files(champion):
         else:
             os.remove(fn)
 
+def extract_legacy_files(player_origin):
+    # Files written before the archive existed are extracted too, delete_files removes them after
+    if os.path.isdir(f"matches/{player_origin}") and os.path.isdir(f"timelines/{player_origin}"):
+        extract_features(f"matches/{player_origin}", f"timelines/{player_origin}")
+
+def extract_origin(player_origin, archive):
+    extract_legacy_files(player_origin)
+    print(f"Extracting features for {len(archive)} games...")
+    extract_archived_features(archive)
+
 def is_valid_match(match_details):
     info = match_details.get("info", {})
     # A team FF'd before 30 min
@@ -113,20 +127,146 @@ def is_valid_match(match_details):
         return (False, True)
     return (True, True)
 
-def main():
-    champion_path = get_champion_data(clean=False)
-    with open(champion_path, "r", encoding="UTF-8") as fp:
-        champions = json.load(fp)
-    all_champions = list(champions.keys())
+def known_match_status(match_index, match_id, player_origin):
+    """Status of a match already seen through any origin, None if it still has to be fetched."""
+    status, origin = match_index.status(match_id)
+    if status == FETCHED and origin == player_origin and not get_match_archive(player_origin).has_match(match_id) and not (
+            os.path.exists(f"matches/{player_origin}/{match_id}_matches.json") and \
+            os.path.exists(f"timelines/{player_origin}/{match_id}_timeline.json")):
+        # Match was removed before its features were extracted
+        return None
+    return status
+
+# Queued after a player's matches, so the player only counts as crawled once they are written
+CrawlCheckpoint = namedtuple("CrawlCheckpoint", ["origin", "puuid", "step", "valid"])
+
+def match_writer(write_queue, match_index=None, pipeline=None):
+    # Single consumer so files are never written by two threads at once
+    while True:
+        match = write_queue.get()
+        if match is None:
+            break
+        if isinstance(match, CrawlCheckpoint):
+            match_index.mark_crawled(*match)
+            continue
+        match_id = write_match(*match)
+        if pipeline is not None:
+            archive = get_match_archive(match[0])
+            pipeline.submit(archive.ref(match_id, MATCH), archive.ref(match_id, TIMELINE))
+
+def has_match_features(match_details):
+    """Whether extract_match_features can read the participants, before the timeline is fetched."""
+    try:
+        return bool(extract_match_features(match_details))
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return False
+
+def crawl_player(player, player_origin, step, count, match_index, fetch_pool, write_queue):
+    macro_region = MACRO_REGION[player['region']]
+    match_ids = get_match_ids(player['puuid'], macro_region, step, count)
+    if not match_ids:
+        print(f"Found no matches for puuid {player['puuid']} in region {player['region']}.")
+        return None
+
+    print(f"Found {len(match_ids)} matches for puuid {player['puuid']} in region {player['region']}, from {str(step*count)} to {str((step+1)*count)}. Fetching details...")
+    valid = 0
+    pending = []
+    for id in match_ids:
+        status = known_match_status(match_index, id, player_origin)
+        if status == OUTDATED:
+            break
+        if status in (FETCHED, EXTRACTED, INVALID):
+            pending.append((id, status, None))
+            continue
+        pending.append((id, None, fetch_pool.submit(get_match_details, id, macro_region)))
+
+    # Details are checked in the same order as the serial crawl, so the patch cutoff still applies.
+    # A timeline is only requested once its details are accepted, and is fetched while the next details are checked
+    accepted = []
+    for i, (id, status, details_future) in enumerate(pending):
+        if status is not None:
+            if status != INVALID:
+                valid += 1
+            continue
+        details = details_future.result()
+        if not details:
+            continue
+        is_valid, can_continue = is_valid_match(details)
+        if not can_continue:
+            match_index.mark(id, OUTDATED, player_origin)
+            for _, later_status, later_details in pending[i:]:
+                if later_status is None:
+                    later_details.cancel()
+            break
+        if not is_valid or not has_match_features(details):
+            match_index.mark(id, INVALID, player_origin)
+            continue
+        accepted.append((id, details, fetch_pool.submit(get_match_timeline, id, macro_region)))
+
+    for id, details, timeline_future in accepted:
+        timeline = timeline_future.result()
+        if not timeline:
+            continue
+        details["metadata"]["origin"] = player["origin"]
+        timeline["metadata"]["origin"] = player["origin"]
+        write_queue.put((player_origin, details, timeline))
+        match_index.mark(id, FETCHED, player_origin)
+        valid += 1
+    print(f"Found {valid} valid matches for puuid {player['puuid']} in region {player['region']}.")
+    return valid
+
+def crawl_region(players, player_origin, step, count, match_index, last_time_valid, workers, write_queue):
+    with ThreadPoolExecutor(max_workers=workers) as fetch_pool:
+        for player in players:
+            valid = crawl_player(player, player_origin, step, count, match_index, fetch_pool, write_queue)
+            if valid is not None:
+                last_time_valid[player['puuid']] = valid
+            write_queue.put(CrawlCheckpoint(player_origin, player['puuid'], step, valid))
+
+def crawl_origin(players, player_origin, step, count, match_index, last_time_valid, workers, pipeline=None):
+    """Crawl one step for all players of an origin, with one worker pool per macro region."""
+    players_by_region = {}
+    for player in players:
+        if last_time_valid.get(player['puuid']) == 0:
+            continue
+        players_by_region.setdefault(MACRO_REGION[player['region']], []).append(player)
+
+    for region in players_by_region:
+        # Timelines of accepted matches are in flight while the next details are fetched
+        mount_host(f"{region}.api.riotgames.com", 2 * workers)
+
+    write_queue = queue.Queue()
+    writer = threading.Thread(target=match_writer, args=(write_queue, match_index, pipeline))
+    writer.start()
+    crawlers = [
+        threading.Thread(
+            target=crawl_region,
+            args=(region_players, player_origin, step, count, match_index, last_time_valid, workers, write_queue)
+        ) for region_players in players_by_region.values()
+    ]
+    try:
+        for crawler in crawlers:
+            crawler.start()
+        for crawler in crawlers:
+            crawler.join()
+    finally:
+        write_queue.put(None)
+        writer.join()
+
+def main(workers=1, extract_workers=1):
+    all_champions = list(get_static_data().champion_names)
 
     total_steps = 100
     start_step = 0
     count = 10
     last_time_valid = {}
+    match_index = get_match_index()
+    # A concurrent crawl extracts features while it fetches, and keeps its progress per player
+    pipeline = ExtractionPipeline(extract_workers) if workers > 1 else None
 
     last_step = -1
     last_origin = last_puuid = ""
-    if os.path.exists("last.txt"):
+    if pipeline is None and os.path.exists("last.txt"):
         with open("last.txt", "r", encoding="UTF-8") as fp:
             info = fp.read()
             last_step, last_origin, last_puuid = info.split(", ")
@@ -149,22 +289,39 @@ def main():
                 count = 100
             else:
                 count = 10
-            os.makedirs(f"matches/{player_origin}", exist_ok=True)
-            os.makedirs(f"timelines/{player_origin}", exist_ok=True)
-
-            with open("features/checked.json", "r") as fp:
-                checked = json.load(fp)
+            archive = get_match_archive(player_origin)
 
             player_info = []
             for player_info_file in os.listdir(os.path.join("player_info", player_origin)):
 
                 fp = os.path.join("player_info", player_origin, player_info_file)
                 print(f"Using file {fp}")
-                with open(fp, "r", encoding="UTF-8") as fp:
-                    players = json.load(fp)
-                    for p in players:
-                        p["origin"] = f"{player_origin}/{player_info_file}"
-                    player_info.extend(players)
+                players = load_player_file(fp)
+                for p in players:
+                    p["origin"] = f"{player_origin}/{player_info_file}"
+                player_info.extend(players)
+
+            if pipeline is not None:
+                # Resumes per player from the crawl progress instead of last.txt
+                progress = match_index.crawl_progress(player_origin)
+                last_time_valid.update({
+                    puuid: valid for puuid, (_, valid) in progress.items() if valid is not None
+                })
+                player_info = [
+                    player for player in player_info
+                    if progress.get(player['puuid'], (-1, None))[0] < step
+                ]
+                # Fetched before a restart but not extracted yet
+                for match_ref, timeline_ref in archive.pairs():
+                    if not match_index.is_extracted(match_ref.match_id):
+                        pipeline.submit(match_ref, timeline_ref)
+                if player_info:
+                    crawl_origin(player_info, player_origin, step, count, match_index, last_time_valid, workers, pipeline)
+                # Extraction ran during the crawl, only the last matches are waited for
+                pipeline.drain()
+                extract_legacy_files(player_origin)
+                delete_files(player_origin)
+                continue
 
             for i, player in enumerate(player_info):
                 if last_puuid and player['puuid'] != last_puuid:
@@ -185,35 +342,47 @@ def main():
                 print(f"Found {len(match_ids)} matches for puuid {player['puuid']} in region {player['region']}, from {str(step*count)} to {str((step+1)*count)}. Fetching details...")
                 valid = 0
                 for id in match_ids:
-                    if (os.path.exists(f"matches/{player_origin}/{id}_matches.json") and \
-                            os.path.exists(f"timelines/{player_origin}/{id}_timeline.json")) or \
-                            id in checked:
+                    status = known_match_status(match_index, id, player_origin)
+                    if status == OUTDATED:
+                        break
+                    if status in (FETCHED, EXTRACTED):
                         valid += 1
                         continue
+                    if status == INVALID:
+                        continue
                     details = get_match_details(id, macro_region)
                     if details:
                         is_valid, can_continue = is_valid_match(details)
                         if not can_continue:
+                            match_index.mark(id, OUTDATED, player_origin)
                             break
-                        if not is_valid:
+                        if not is_valid or not has_match_features(details):
+                            match_index.mark(id, INVALID, player_origin)
                             continue
                         timeline = get_match_timeline(id, macro_region)
                         if not timeline:
                             continue
-                        details["metadata"]["origin"] = p["origin"]
-                        timeline["metadata"]["origin"] = p["origin"]
+                        details["metadata"]["origin"] = player["origin"]
+                        timeline["metadata"]["origin"] = player["origin"]
                         write_match(player_origin, details, timeline)
+                        match_index.mark(id, FETCHED, player_origin)
                         valid += 1
                 print(f"Found {valid} valid matches for puuid {player['puuid']} in region {player['region']}.")
                 last_time_valid[player['puuid']] = valid
 
-                total_matches = len(os.listdir(f"timelines/{player_origin}"))
-                print(f"Extracting features for {total_matches} games...")
-                checked = extract_features(f"matches/{player_origin}", f"timelines/{player_origin}")
+                extract_origin(player_origin, archive)
                 delete_files(player_origin)
 
                 with open(f"last.txt", "w+") as fp:
                     fp.write(f"{step}, {player['origin']}, {player['puuid']}")
 
+    if pipeline is not None:
+        pipeline.close()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = ArgumentParser(description="Crawl matches and extract their features.")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Fetch workers per macro region, values above 1 crawl all regions concurrently while features are extracted (default: 1, serial crawl)')
+    parser.add_argument('-e', '--extract-workers', type=int, default=1, help='Processes extracting features during a concurrent crawl (default: 1)')
+    args = parser.parse_args()
+
+    main(args.workers, args.extract_workers)
\ No newline at end of file
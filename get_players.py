@@ -1,16 +1,21 @@
 import os
 import json
-import wget
 import requests
+import threading
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from api import make_request
-from get_game_data import get_champion_data
+from http_client import download, get, mount_host
+from static_data import get_static_data
+from champion_pages import BestPlayersParser, MonochampionsParser, parse_page, scrape_pages
 
 RANKED_QUEUES = ["RANKED_SOLO_5x5", "RANKED_FLEX_SR"]
 ALL_SERVERS = ["br1", "eun1", "euw1", "jp1", "kr", "la1", "la2", "me1", "na1", "oc1", "ru", "sg2", "tr1", "tw2", "vn2"]
 SERVER_MAPPING = {"BR": ["br1"], "NA": ["na1"], "OCE": ["oc1"], "EUNE": ["eun1"], "EUW": ["euw1"], "JP": ["jp1"], "KR": ["kr"], "LAN": ["la1", "la2"], "LAS": ["la1", "la2"], "RU": ["ru"], "TR": ["tr1"], "TW": ["tw2"], "SG": ["sg2"], "VN": ["vn2"], "MENA": ["me1"], "TH": ["oc1"], "SEA": ["oc1", "sg2", "tw2", "vn2"], "ME": ["me1"], "PH": ["oc1"]}
 FETCHING_MODES = {"mono", "best", "rank"}
 ALL_CHAMPIONS = {}
+ACCOUNT_HOST = "americas"
 RANKS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
 
 def get_monochampions_html(champion_id, champion_name):
@@ -19,7 +24,9 @@ def get_monochampions_html(champion_id, champion_name):
     if os.path.exists(filename):
         return filename
     url = f'https://championmastery.gg/champion?champion={champion_id}'
-    filename = wget.download(url, out=filename)
+    if not download(url, filename):
+        print(f"Couldn't download from {url}")
+        return None
     print(f"Champion HTML downloaded: {filename}")
     return filename
 
@@ -32,73 +39,32 @@ def get_best_players_html(champion_name):
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        with open(filepath, "w+", encoding="utf-8") as f:
-            f.write(response.text)
-        print(f"\nChampion HTML downloaded: {filepath}")
-    else:
+    response = get(url, headers=headers)
+    if response.status_code != 200:
         print(f"\nCouldn't download from {url}")
+        return None
+    with open(filepath, "w+", encoding="utf-8") as f:
+        f.write(response.text)
+    print(f"\nChampion HTML downloaded: {filepath}")
     return filepath
 
 def load_champion_data():
-    path = get_champion_data(clean=False)
-    with open(path, 'r', encoding='utf-8') as file:
-        champ_info = json.load(file)
-        for champ_name in champ_info:
-            ALL_CHAMPIONS[champ_name] = champ_info[champ_name]["id"]
+    ALL_CHAMPIONS.update(get_static_data().champion_name_to_id)
 
 def extract_best_players(html_file):
-    players = []
-    split_str = '<span class="name">'
-    region_str = '<i>'
-    with open(html_file, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-    for line in lines:
-        if split_str in line:
-            l = line.strip().split(split_str)[1]
-            id_start = 0
-            id_end = l.find('<')
-            player_info = l[id_start:id_end].split('#')
-            if len(player_info) != 2:
-                continue
-        elif region_str in line:
-            l = line.strip().split(region_str)[1]
-            region = l[:l.find("</i>")]
-            players.append({
-                'gameName': player_info[0],
-                'tagLine': player_info[1],
-                'region': SERVER_MAPPING[region],
-            })
+    players = parse_page(html_file, BestPlayersParser(SERVER_MAPPING))
     print(f"Total players extracted: {len(players)}")
     return players
 
 def extract_monochampions(html_file):
-    players = []
-    with open(html_file, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-    for line in lines:
-        if 'summoner-lookup' in line:
-            line = line.strip().split("region=")
-            for l in line:
-                region = l[:l.find('\"')]
-                id_start = l.find('>') + 1
-                id_end = l.find('<')
-                player_info = l[id_start:id_end].split('#')
-                if len(player_info) != 2:
-                    continue
-                players.append({
-                    'gameName': player_info[0][:-1],
-                    'tagLine': player_info[1],
-                    'region': SERVER_MAPPING[region],
-                })
+    players = parse_page(html_file, MonochampionsParser(SERVER_MAPPING))
     print(f"Total players extracted: {len(players)}")
     return players
 
 def puuid_request(gameName, tagLine):
     gameName = requests.utils.quote(gameName, safe='')
     tagLine = requests.utils.quote(tagLine, safe='')
-    url = f"https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}"
+    url = f"https://{ACCOUNT_HOST}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}"
     response = make_request(url)
     if response.status_code != 200:
         return None
@@ -145,7 +111,90 @@ def rank_request(puuid, server_region):
         'matches': 0
     }
 
-def get_ranked_info(player_infos: list[dict], ammount):
+class HostPools:
+    """
+    One thread pool per API host (the account host and each platform), so lookups to
+    different platforms run side by side and each one only waits on its own rate limits.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def submit(self, host, funct, *args):
+        with self.lock:
+            if host not in self.pools:
+                mount_host(f"{host}.api.riotgames.com", self.workers)
+                self.pools[host] = ThreadPoolExecutor(max_workers=self.workers)
+            pool = self.pools[host]
+        return pool.submit(funct, *args)
+
+    def shutdown(self):
+        with self.lock:
+            for pool in self.pools.values():
+                pool.shutdown(cancel_futures=True)
+            self.pools = {}
+
+def is_qualified(rank_info):
+    # Minimum 100 matches and 50% win rate
+    return rank_info and rank_info.get('matches') >= 100 \
+        and rank_info.get('win_rate') > 0.5
+
+def resolve_ranked_player(info, pools, stop):
+    """Ranked info of a player, probing all of its regions at once. None if it doesn't qualify."""
+    if stop.is_set():
+        return None
+    puuid_response = pools.submit(ACCOUNT_HOST, puuid_request, info['gameName'], info['tagLine']).result()
+    if not puuid_response or stop.is_set():
+        return None
+    puuid = puuid_response.get('puuid')
+    regions = info.get('region', [])
+    probes = [pools.submit(region, rank_request, puuid, region) for region in regions]
+    # Probes run at the same time but are checked in region order, as in the serial lookup:
+    # the first qualifying region wins even when a later one answers before it
+    for i, (region, probe) in enumerate(zip(regions, probes)):
+        rank_info = probe.result()
+        if is_qualified(rank_info):
+            for later in probes[i + 1:]:
+                later.cancel()
+            return {
+                **rank_info,
+                'region': region,
+                'puuid': puuid
+            }
+    return None
+
+def get_ranked_info_concurrent(player_infos, ammount, pools):
+    """Same as get_ranked_info, with a window of players being resolved at the same time."""
+    results = []
+    stop = threading.Event()
+    window = 2 * pools.workers
+    in_flight = deque()
+    players = iter(player_infos)
+    with ThreadPoolExecutor(max_workers=window) as resolvers:
+        for info in players:
+            in_flight.append(resolvers.submit(resolve_ranked_player, info, pools, stop))
+            if len(in_flight) < window:
+                continue
+            # Results are taken in player order, as in the serial lookup
+            result = in_flight.popleft().result()
+            if result:
+                results.append(result)
+            if len(results) >= ammount:
+                break
+        while in_flight and len(results) < ammount:
+            result = in_flight.popleft().result()
+            if result:
+                results.append(result)
+        stop.set()
+        for future in in_flight:
+            future.cancel()
+    print(f"Total ranked info found: {len(results)}")
+    return results
+
+def get_ranked_info(player_infos: list[dict], ammount, pools=None):
+    if pools is not None:
+        return get_ranked_info_concurrent(player_infos, ammount, pools)
     results = []
     for info in player_infos:
         puuid_response = puuid_request(info['gameName'], info['tagLine'])
@@ -156,9 +205,7 @@ def get_ranked_info(player_infos: list[dict], ammount):
         for region in regions:
             rank_info = rank_request(puuid, region)
             # Take ranked info based on 1st region
-            # Minimum 100 matches and 50% win rate
-            if rank_info and rank_info.get('matches') >= 100 \
-                    and rank_info.get('win_rate') > 0.5:
+            if is_qualified(rank_info):
                 results.append({
                     **rank_info,
                     'region': region,
@@ -181,31 +228,39 @@ def save_results(results, folder, filename):
     out_path = os.path.join(folder_path, filename)
     write_to_json(results, out_path)
 
-def get_monochampions(champion_name, champion_id, ammount=100):
+def get_monochampions(champion_name, champion_id, ammount=100, pools=None, players=None):
     if os.path.exists(os.path.join('player_info', champion_name, "mono.json")):
         print(f"Monochampion file for {champion_name} already exists")
         return False
     print(f"Getting monochampions for {champion_name}")
-    html_file = get_monochampions_html(champion_id, champion_name)
-    players = extract_monochampions(html_file)
-    players_ranked_info = get_ranked_info(players, ammount)
+    if players is None:
+        html_file = get_monochampions_html(champion_id, champion_name)
+        if html_file is None:
+            print(f"Skipping monochampions of {champion_name}")
+            return False
+        players = extract_monochampions(html_file)
+        os.remove(html_file)
+    players_ranked_info = get_ranked_info(players, ammount, pools)
     save_results(players_ranked_info, champion_name, "mono.json")
-    os.remove(html_file)
     return True
 
-def get_best_players(champion_name, champion_id, ammount=100):
+def get_best_players(champion_name, champion_id, ammount=100, pools=None, players=None):
     if os.path.exists(os.path.join('player_info', champion_name, "best.json")):
         print(f"Best players file for {champion_name} already exists")
         return False
     print(f"Getting best players for {champion_name}")
-    html_file = get_best_players_html(champion_name)
-    players = extract_best_players(html_file)
-    players_ranked_info = get_ranked_info(players, ammount)
+    if players is None:
+        html_file = get_best_players_html(champion_name)
+        if html_file is None:
+            print(f"Skipping best players of {champion_name}")
+            return False
+        players = extract_best_players(html_file)
+        os.remove(html_file)
+    players_ranked_info = get_ranked_info(players, ammount, pools)
     save_results(players_ranked_info, champion_name, "best.json")
-    os.remove(html_file)
     return True
 
-def get_rank_players(rank, ammount=100):
+def get_rank_players(rank, ammount=100, pools=None):
     if os.path.exists(os.path.join('player_info', rank, "players.json")):
         print(f"Players file for {rank} rank already exists")
         return False
@@ -213,9 +268,12 @@ def get_rank_players(rank, ammount=100):
     players = []
     per_server_limit = ammount / len(ALL_SERVERS)
     per_server_limit = per_server_limit if per_server_limit > 1 else 1
-    for server in ALL_SERVERS:
+    if pools is not None:
+        # Every server is asked at once, the answers are still read in server order
+        entries = [pools.submit(server, entry_request, rank, server) for server in ALL_SERVERS]
+    for i, server in enumerate(ALL_SERVERS):
         count = 0
-        info = entry_request(rank, server)
+        info = entries[i].result() if pools is not None else entry_request(rank, server)
         if not info:
             continue
         for player in info:
@@ -242,6 +300,23 @@ def main(args):
         "best": get_best_players,
         "mono": get_monochampions,
     }
+    pools = HostPools(args.workers) if args.workers > 1 else None
+    try:
+        discover(args, mode_functs, pools)
+    finally:
+        if pools is not None:
+            pools.shutdown()
+
+def discover(args, mode_functs, pools):
+    candidates = None
+    if pools is not None:
+        # Every champion page is fetched and parsed up front, keeping the pages for conditional requests
+        candidates = scrape_pages([
+            (mode, champ_name, ALL_CHAMPIONS[champ_name])
+            for champ_name in args.champions
+            for mode in mode_functs
+            if mode in args.modes and not os.path.exists(os.path.join('player_info', champ_name, f"{mode}.json"))
+        ], SERVER_MAPPING)
     for champ_name in args.champions:
         for mode, funct in mode_functs.items():
             if mode not in args.modes:
@@ -250,12 +325,23 @@ def main(args):
                 "champion_name": champ_name,
                 "champion_id": ALL_CHAMPIONS[champ_name],
                 "ammount": args.n,
+                "pools": pools,
             }
+            if candidates is not None:
+                # A page that couldn't be scraped falls back to the single page download
+                funct_args["players"] = candidates.get((mode, champ_name))
             if funct(**funct_args):
                 print("\033[92mDONE\033[0m\n")
     if "rank" in args.modes:
-        for rank in args.ranks:
-            if get_rank_players(rank, args.n):
+        if pools is not None:
+            # All ranks are fetched at once, sharing the per-server pools
+            with ThreadPoolExecutor(max_workers=len(args.ranks)) as rank_pool:
+                rank_futures = [rank_pool.submit(get_rank_players, rank, args.n, pools) for rank in args.ranks]
+            done = [future.result() for future in rank_futures]
+        else:
+            done = (get_rank_players(rank, args.n) for rank in args.ranks)
+        for rank_done in done:
+            if rank_done:
                 print("\033[92mDONE\033[0m\n")
 
 def handle_args(args):
@@ -305,6 +391,7 @@ if __name__ == "__main__":
     parser.add_argument('-c', '--champions', type=str, nargs='+', help='List of champion names to process (default: all) - Only for "best" and "mono"')
     parser.add_argument('-r', '--ranks', type=str, nargs='+', help='List of ranks to fetch (default: all) - Only for "rank"')
     parser.add_argument('-n', type=int, help='Maximum ammount of fetched players per type/rank')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Concurrent lookups per API host, values above 1 scrape all champion pages up front and query all servers at the same time (default: 1, serial lookups)')
     parser.add_argument('--clean', action='store_true', help='Make a clean run, removing existing player info files')
     args = parser.parse_args()
 
@@ -0,0 +1,60 @@
+import os
+import requests
+import threading
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()  # .env
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+CHUNK_SIZE = 64 * 1024
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+_HOST_POOL_SIZES = {}
+
+def get_session():
+    """Shared session, so connections to each host are kept alive and reused."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            _SESSION.headers.update(DEFAULT_HEADERS)
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _SESSION.mount("https://", adapter)
+            _SESSION.mount("http://", adapter)
+        return _SESSION
+
+def mount_host(host, pool_size):
+    """Give a host its own connection pool, e.g. one slot per worker fetching from it."""
+    session = get_session()
+    with _SESSION_LOCK:
+        if _HOST_POOL_SIZES.get(host, 0) >= pool_size:
+            return
+        session.mount(f"https://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        _HOST_POOL_SIZES[host] = pool_size
+
+def get(url, headers=None, timeout=None, **kwargs):
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return get_session().get(url, headers=headers, timeout=timeout, **kwargs)
+
+def download(url, path, headers=None):
+    """Stream url into path. Returns path, or None if the request failed."""
+    response = get(url, headers=headers, stream=True)
+    if response.status_code != 200:
+        response.close()
+        return None
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with response, open(path, "wb") as fp:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            fp.write(chunk)
+    return path
@@ -0,0 +1,159 @@
+import os
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http_client import download, mount_host
+from static_data import get_static_data, snapshot_folder
+
+ICON_WORKERS = 16
+ICON_SIZE = 64
+ITEMS = "items"
+CHAMPIONS = "champions"
+# Drawn for items without an icon, as the notebooks did
+EMPTY_ICON_KEY = "empty"
+EMPTY_ICON_URL = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/data/spells/icons2d/summoner_empty.png"
+
+def icons_folder(version):
+    return os.path.join(snapshot_folder(version), "icons")
+
+def icon_urls(static_data, kind):
+    """{key: url} of every icon of a kind, items keyed by str id and champions by name."""
+    if kind == ITEMS:
+        urls = {str(item_id): info.get("icon") for item_id, info in static_data.item_catalog.info.items()}
+        urls[EMPTY_ICON_KEY] = EMPTY_ICON_URL
+    else:
+        urls = dict(static_data.champion_icons)
+    return {key: url for key, url in urls.items() if url}
+
+def fetch_icons(urls, folder, workers=ICON_WORKERS):
+    """Download the icons missing from folder, all at once. Returns the keys that failed."""
+    os.makedirs(folder, exist_ok=True)
+    missing = {key: url for key, url in urls.items() if not os.path.exists(os.path.join(folder, f"{key}.png"))}
+    if not missing:
+        return []
+    print(f"Fetching {len(missing)} icons into {folder}")
+    for host in {url.split("/")[2] for url in missing.values()}:
+        mount_host(host, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(missing, pool.map(
+            lambda key: download(missing[key], os.path.join(folder, f"{key}.png")), missing
+        )))
+    failed = [key for key, path in results.items() if not path]
+    if failed:
+        print(f"Couldn't download {len(failed)} icons, e.g. {missing[failed[0]]}")
+    return failed
+
+def build_atlas(folder, out_path, size=ICON_SIZE):
+    """
+    Pack every icon of folder into one sprite sheet of size x size cells, plus a
+    {key: [x, y]} index next to it, so all of them are read with a single image open.
+    """
+    from PIL import Image
+    keys = sorted(fn[:-4] for fn in os.listdir(folder) if fn.endswith(".png"))
+    columns = max(1, math.ceil(math.sqrt(len(keys))))
+    rows = max(1, (len(keys) + columns - 1) // columns)
+    atlas = Image.new("RGBA", (columns * size, rows * size))
+    index = {}
+    for i, key in enumerate(keys):
+        try:
+            with Image.open(os.path.join(folder, f"{key}.png")) as icon:
+                icon = icon.convert("RGBA").resize((size, size))
+        except OSError:
+            continue
+        x, y = (i % columns) * size, (i // columns) * size
+        atlas.paste(icon, (x, y))
+        index[key] = [x, y]
+    atlas.save(f"{out_path}.png")
+    with open(f"{out_path}.json", "w", encoding="utf-8") as fp:
+        json.dump({"size": size, "icons": index}, fp)
+    return index
+
+def prefetch_icons(kind, version=None, workers=ICON_WORKERS, atlas=True):
+    """Download every icon of a kind for a patch and, with atlas, pack them into a sprite sheet."""
+    static_data = get_static_data(version)
+    folder = os.path.join(icons_folder(static_data.version), kind)
+    failed = fetch_icons(icon_urls(static_data, kind), folder, workers)
+    atlas_path = os.path.join(icons_folder(static_data.version), kind)
+    # Adding icons changes the folder's mtime, the atlas is only packed again then
+    if atlas and (not os.path.exists(f"{atlas_path}.json") or os.stat(folder).st_mtime_ns > os.stat(f"{atlas_path}.json").st_mtime_ns):
+        build_atlas(folder, atlas_path)
+    return failed
+
+class IconCache:
+    """
+    Item and champion icons of a patch, read from its atlas (or the single icon files)
+    and kept in memory, so drawing a build doesn't touch the network.
+    """
+    def __init__(self, version=None):
+        self.version = get_static_data(version).version
+        self.folder = icons_folder(self.version)
+        self.atlases = {}
+        self.icons = {}
+        self.lock = threading.Lock()
+
+    def _atlas(self, kind):
+        if kind not in self.atlases:
+            path = os.path.join(self.folder, kind)
+            if not os.path.exists(f"{path}.json") and not os.path.isdir(path):
+                # First use of this patch, every icon is fetched at once
+                prefetch_icons(kind, self.version)
+            atlas = None
+            if os.path.exists(f"{path}.json") and os.path.exists(f"{path}.png"):
+                from PIL import Image
+                with open(f"{path}.json", "r", encoding="utf-8") as fp:
+                    index = json.load(fp)
+                with Image.open(f"{path}.png") as sheet:
+                    atlas = (sheet.copy(), index["size"], index["icons"])
+            self.atlases[kind] = atlas
+        return self.atlases[kind]
+
+    def _load(self, kind, key):
+        from PIL import Image
+        atlas = self._atlas(kind)
+        if atlas is not None:
+            sheet, size, index = atlas
+            if key in index:
+                x, y = index[key]
+                return sheet.crop((x, y, x + size, y + size))
+        path = os.path.join(self.folder, kind, f"{key}.png")
+        if os.path.exists(path):
+            try:
+                with Image.open(path) as icon:
+                    return icon.copy()
+            except OSError:
+                pass
+        return None
+
+    def get(self, kind, key):
+        with self.lock:
+            if (kind, key) not in self.icons:
+                self.icons[(kind, key)] = self._load(kind, key)
+            return self.icons[(kind, key)]
+
+    def item(self, item_id):
+        if not item_id:
+            return None
+        icon = self.get(ITEMS, str(int(item_id)))
+        if icon is None:
+            icon = self.get(ITEMS, EMPTY_ICON_KEY)
+        return icon if icon is not None else self.blank()
+
+    def champion(self, champion_name):
+        if not champion_name:
+            return None
+        icon = self.get(CHAMPIONS, champion_name)
+        return icon if icon is not None else self.blank()
+
+    def blank(self):
+        from PIL import Image
+        return Image.new("RGB", (ICON_SIZE, ICON_SIZE))
+
+_ICON_CACHES = {}
+
+def get_icon_cache(version=None):
+    """Icons of a patch (the current one by default), opened once per process."""
+    version = get_static_data(version).version
+    if version not in _ICON_CACHES:
+        _ICON_CACHES[version] = IconCache(version)
+    return _ICON_CACHES[version]
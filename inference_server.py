@@ -0,0 +1,332 @@
+import os
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from argparse import ArgumentParser
+import numpy as np
+from metrics import top_k, TOP_K
+
+MODEL_FILE = "model.pt"
+SCHEMA_FILE = "model.json"
+MAX_BATCH = 64
+MAX_WAIT_MS = 2
+LANES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+RANKS = [None, "IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
+TEAMS = [100, 200]
+# How a model's columns are built from a request: the timeline dataset's player_/ally_/enemy_<champion>,
+# perk_, item_, lane and stats columns, or the postgame notebooks' team100_/team200_<champion> columns
+LANE_ENCODING = "lane"
+TEAMS_ENCODING = "teams"
+ENCODINGS = [LANE_ENCODING, TEAMS_ENCODING]
+CHAMPION_PREFIXES = {
+    LANE_ENCODING: ("player_", "ally_", "enemy_"),
+    TEAMS_ENCODING: tuple(f"team{team}_" for team in TEAMS),
+}
+REQUEST_FIELDS = {
+    LANE_ENCODING: {"champion", "allies", "enemies", "perks", "items", "lane", "tier", "stats", "features", "k"},
+    TEAMS_ENCODING: {"champion", "team", "allies", "enemies", "features", "k"},
+}
+
+def save_recommender(folder, model, columns, item_ids, encoding=LANE_ENCODING):
+    """
+    Save a trained torch model as TorchScript next to its feature schema: the input
+    columns in training order, the encoding that builds them from a request (see
+    RequestEncoder) and the item id of every output index.
+    """
+    import torch
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding {encoding}, expected one of {ENCODINGS}")
+    os.makedirs(folder, exist_ok=True)
+    model.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(1, len(columns), dtype=torch.float32))
+    torch.jit.save(traced, os.path.join(folder, MODEL_FILE))
+    with open(os.path.join(folder, SCHEMA_FILE), "w", encoding="utf-8") as fp:
+        json.dump({
+            "columns": list(columns),
+            "encoding": encoding,
+            "item_ids": [int(item_id) for item_id in item_ids],
+        }, fp)
+
+def load_torch_model(path, threads=None):
+    """Batch scoring function of a TorchScript model: float32 (n, columns) -> (n, items)."""
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    model = torch.jit.load(path, map_location="cpu")
+    model.eval()
+    def score(X):
+        with torch.inference_mode():
+            return model(torch.from_numpy(X)).numpy()
+    return score
+
+class RequestEncoder:
+    """
+    Turns recommendation requests into model input rows, with the columns of the model's
+    encoding. LANE_ENCODING, the column names build_new_row gives a training row:
+        {"champion": "Kaisa", "allies": [...], "enemies": [...], "perks": [8008, ...],
+         "items": [3006, ...], "lane": "BOTTOM", "tier": "GOLD",
+         "stats": {"kda": 2.5, "level": 11, ...}, "features": {"any_column": value}}
+    TEAMS_ENCODING, the champions of each team, allies on the champion's team:
+        {"champion": "Kaisa", "team": 100, "allies": [...], "enemies": [...], "features": {...}}
+    Champions may be given by name or id. Fields and values the model has no column for
+    are returned as ignored instead of being dropped silently.
+    """
+    def __init__(self, columns, champion_id_to_name=None, encoding=LANE_ENCODING):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding}, expected one of {ENCODINGS}")
+        self.columns = list(columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self.champion_id_to_name = champion_id_to_name or {}
+        self.encoding = encoding
+
+    def champion_columns(self):
+        """Model columns the encoding sets from the request's champions."""
+        return [column for column in self.columns if column.startswith(CHAMPION_PREFIXES[self.encoding])]
+
+    def _champion(self, champion):
+        if isinstance(champion, int):
+            return self.champion_id_to_name.get(champion)
+        return champion
+
+    def _lane_names(self, request):
+        names = []
+        player = self._champion(request.get("champion"))
+        if player:
+            names.append(f"player_{player}")
+        for champion in request.get("allies", []):
+            champion = self._champion(champion)
+            if champion != player:
+                names.append(f"ally_{champion}")
+        names += [f"enemy_{self._champion(champion)}" for champion in request.get("enemies", [])]
+        names += [f"perk_{perk}" for perk in request.get("perks", [])]
+        names += [f"item_{item}" for item in request.get("items", []) if item]
+        if request.get("lane"):
+            names.append(request["lane"])
+        values = dict(request.get("stats", {}))
+        if "tier" in request:
+            values["tier"] = RANKS.index(request["tier"]) if request["tier"] in RANKS else 0
+        return names, values
+
+    def _team_names(self, request):
+        team = int(request.get("team", TEAMS[0]))
+        if team not in TEAMS:
+            raise ValueError(f"team must be one of {TEAMS}, got {team}")
+        other = TEAMS[1 - TEAMS.index(team)]
+        names = []
+        if request.get("champion"):
+            names.append(f"team{team}_{self._champion(request['champion'])}")
+        names += [f"team{team}_{self._champion(champion)}" for champion in request.get("allies", [])]
+        names += [f"team{other}_{self._champion(champion)}" for champion in request.get("enemies", [])]
+        return names, {}
+
+    def active(self, request):
+        """
+        (column index, value) pairs set by a request, and the request fields and
+        columns the model doesn't use. Raises ValueError on a malformed request.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("a request must be a JSON object")
+        if self.encoding == TEAMS_ENCODING:
+            names, values = self._team_names(request)
+        else:
+            names, values = self._lane_names(request)
+        features = request.get("features", {})
+        if not isinstance(features, dict):
+            raise ValueError("features must be an object of column: value")
+        values.update(features)
+        ignored = sorted(field for field in request if field not in REQUEST_FIELDS[self.encoding])
+        ignored += [name for name in names if name not in self.index]
+        ignored += [name for name in values if name not in self.index]
+        pairs = [(self.index[name], 1.0) for name in names if name in self.index]
+        pairs += [(self.index[name], float(value)) for name, value in values.items() if name in self.index]
+        return pairs, ignored
+
+    def to_rows(self, active_rows):
+        """Input matrix of the (column index, value) pairs of each row."""
+        rows, cols, values = [], [], []
+        for row, pairs in enumerate(active_rows):
+            for col, value in pairs:
+                rows.append(row)
+                cols.append(col)
+                values.append(value)
+        X = np.zeros((len(active_rows), len(self.columns)), dtype=np.float32)
+        X[rows, cols] = values
+        return X
+
+    def encode(self, requests):
+        return self.to_rows([self.active(request)[0] for request in requests])
+
+class MicroBatcher:
+    """
+    Collects requests from many threads and scores them together: a batch is run as soon
+    as max_batch requests are waiting, or max_wait_ms after its first request arrived.
+    Requests are checked and encoded by the thread submitting them, so a malformed one
+    only fails its own future.
+    """
+    def __init__(self, score, encoder, item_ids, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.score = score
+        self.encoder = encoder
+        # Output index -> item id, instead of searching item_id_to_idx for each index
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def _prepare(self, request):
+        pairs, ignored = self.encoder.active(request)
+        k = request.get("k", TOP_K)
+        if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+            raise ValueError(f"k must be a positive integer, got {k!r}")
+        return pairs, ignored, k
+
+    def submit(self, request):
+        future = Future()
+        try:
+            prepared = self._prepare(request)
+        except (ValueError, TypeError, AttributeError) as e:
+            future.set_exception(ValueError(f"Invalid request: {e}"))
+            return future
+        self.queue.put((prepared, future))
+        return future
+
+    def recommend(self, request, timeout=None):
+        return self.submit(request).result(timeout)
+
+    def close(self):
+        self.queue.put(None)
+        self.worker.join()
+
+    def _collect(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self.queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                X = self.encoder.to_rows([pairs for (pairs, _, _), _ in batch])
+                scores = np.asarray(self.score(X))
+                best = top_k(scores, max(k for (_, _, k), _ in batch))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for i, ((_, ignored, k), future) in enumerate(batch):
+                indices = best[i, :k]
+                result = {
+                    "items": self.item_ids[indices].tolist(),
+                    "scores": scores[i, indices].tolist(),
+                }
+                if ignored:
+                    result["ignored"] = ignored
+                future.set_result(result)
+
+def load_batcher(folder, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, threads=None):
+    from static_data import get_static_data
+    with open(os.path.join(folder, SCHEMA_FILE), "r", encoding="utf-8") as fp:
+        schema = json.load(fp)
+    encoding = schema.get("encoding", LANE_ENCODING)
+    encoder = RequestEncoder(schema["columns"], get_static_data().champion_id_to_name, encoding)
+    if not encoder.champion_columns():
+        # e.g. a team100_/team200_ model saved without its encoding: no request could set its inputs
+        raise ValueError(f"{folder}: none of the model's columns fit the {encoding} encoding, save it with the encoding it was trained on")
+    score = load_torch_model(os.path.join(folder, MODEL_FILE), threads)
+    return MicroBatcher(score, encoder, schema["item_ids"], max_batch, max_wait_ms)
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """POST /recommend with a request (or a list of them), GET /health."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+    batcher = None
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/recommend":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self._send(400, {"error": "invalid JSON"})
+            return
+        requests = body if isinstance(body, list) else [body]
+        futures = [self.batcher.submit(request) for request in requests]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({"error": str(e)})
+        if isinstance(body, list):
+            # Each request of a list gets its own result or error
+            self._send(200, results)
+        else:
+            self._send(400 if "error" in results[0] else 200, results[0])
+
+    def log_message(self, format, *args):
+        pass
+
+class RecommendationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once, the default backlog of 5 would reset them
+    request_queue_size = 256
+
+def serve(batcher, host="127.0.0.1", port=8080):
+    handler = type("Handler", (RecommendationHandler,), {"batcher": batcher})
+    server = RecommendationServer((host, port), handler)
+    print(f"Serving recommendations on http://{host}:{port}/recommend")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping server")
+    finally:
+        server.server_close()
+        batcher.close()
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve item recommendations from a saved model.")
+    parser.add_argument('model', type=str, help=f'Folder with {MODEL_FILE} and {SCHEMA_FILE}, written by save_recommender')
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('-p', '--port', type=int, default=8080)
+    parser.add_argument('-b', '--max-batch', type=int, default=MAX_BATCH, help=f'Most requests scored together (default: {MAX_BATCH})')
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS, help=f'Longest a request waits for its batch to fill (default: {MAX_WAIT_MS})')
+    parser.add_argument('-t', '--threads', type=int, help='Torch intra-op threads (default: torch decides)')
+    args = parser.parse_args()
+
+    serve(load_batcher(args.model, args.max_batch, args.max_wait_ms, args.threads), args.host, args.port)
@@ -0,0 +1,38 @@
+ITEM_UPGRADES = {
+    3004: 3042, # gota ad
+    3003: 3040, # gota ap
+    3119: 3121, # gota tank
+    3010: 3013, # bota void
+    3866: 3867, # item de sup
+}
+# Support item quest: once 3867 is destroyed, one of these takes its place
+SUPPORT_QUEST_ITEM = 3867
+SUPPORT_ITEMS = (3869, 3870, 3871, 3876, 3877)
+
+def is_analysed(item_info):
+    """Items kept in the features: completed items, boots, upgradable tier 2 items and starters."""
+    return item_info["tier"] >= 3 or (item_info["tier"] == 2 and \
+        ("BOOTS" in item_info["rank"] or item_info["id"] in ITEM_UPGRADES)) or \
+        ("STARTER" in item_info["rank"])
+
+class ItemCatalog:
+    """
+    Lookup tables built once from get_item_data's items.json, membership tests use frozensets.
+    """
+    def __init__(self, item_info):
+        self.info = {int(str_id): info for str_id, info in item_info.items()}
+        self.tier = {item_id: info["tier"] for item_id, info in self.info.items()}
+        self.rank = {item_id: frozenset(info["rank"]) for item_id, info in self.info.items()}
+        # Same order as items.json, which the features and the notebooks rely on
+        self.analysed_ids = tuple(item_id for item_id, info in self.info.items() if is_analysed(info))
+        self.analysed = frozenset(self.analysed_ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.analysed
+
+    def name(self, item_id):
+        return self.info.get(int(item_id), {}).get("name")
+
+    def analysed_info(self):
+        """{str_id: info} of the analysed items, the ITEMS dict used by the notebooks."""
+        return {str(item_id): self.info[item_id] for item_id in self.analysed_ids}
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import struct
+import shutil
+import sqlite3
+import threading
+from collections import namedtuple
+
+ARCHIVE_FOLDER = "archive"
+BACKUP_FOLDER = "backup"
+SEGMENT_SUFFIX = ".seg"
+# A new segment is started once the active one passes this size
+SEGMENT_MAX_BYTES = 256 * 1024 ** 2
+ZSTD_LEVEL = 3
+
+MATCH = 0
+TIMELINE = 1
+# magic, kind, match id length, compressed length, uncompressed length
+RECORD_HEADER = struct.Struct("<4sBHII")
+RECORD_MAGIC = b"MREC"
+
+# Location of a compressed record, small enough to send to extraction workers
+RecordRef = namedtuple("RecordRef", ["match_id", "kind", "segment", "offset", "length", "raw_size"])
+
+def compress(data):
+    import pyarrow as pa
+    return pa.Codec("zstd", compression_level=ZSTD_LEVEL).compress(data, asbytes=True)
+
+def open_record(ref):
+    """Binary stream decompressing the record as it is read."""
+    import pyarrow as pa
+    with open(ref.segment, "rb") as fp:
+        fp.seek(ref.offset)
+        data = fp.read(ref.length)
+    return pa.input_stream(pa.py_buffer(data), compression="zstd")
+
+def read_record(ref):
+    with open_record(ref) as fp:
+        return json.loads(fp.read())
+
+def open_source(source):
+    """Binary stream of a match or timeline, given a file path or a RecordRef."""
+    if isinstance(source, RecordRef):
+        return open_record(source)
+    return open(source, "rb")
+
+def source_name(source):
+    if isinstance(source, RecordRef):
+        return f"{source.match_id} ({os.path.basename(source.segment)})"
+    return os.path.basename(source)
+
+def iter_segment(path):
+    """(match_id, kind, offset, length, raw_size) of every record in a segment file."""
+    with open(path, "rb") as fp:
+        while True:
+            header = fp.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            magic, kind, id_length, length, raw_size = RECORD_HEADER.unpack(header)
+            if magic != RECORD_MAGIC:
+                print(f"Corrupted record in {path}, stopping at offset {fp.tell() - RECORD_HEADER.size}")
+                return
+            match_id = fp.read(id_length).decode("utf-8")
+            offset = fp.tell()
+            if offset + length > os.fstat(fp.fileno()).st_size:
+                print(f"Incomplete record {match_id} at the end of {path}")
+                return
+            fp.seek(length, os.SEEK_CUR)
+            yield match_id, kind, offset, length, raw_size
+
+class MatchArchive:
+    """
+    Append-only storage of the match details and timelines of one origin: zstd compressed
+    JSON records packed in segment files, plus a SQLite index from matchId to the record
+    offsets. Replaces the matches/{origin} and timelines/{origin} folders of one file per match.
+    """
+    def __init__(self, origin, folder=ARCHIVE_FOLDER):
+        self.origin = origin
+        self.path = os.path.join(folder, origin)
+        os.makedirs(self.path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(self.path, "index.db"), timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "match_id TEXT NOT NULL, kind INTEGER NOT NULL, segment TEXT NOT NULL, "
+                "offset INTEGER NOT NULL, length INTEGER NOT NULL, raw_size INTEGER NOT NULL, "
+                "PRIMARY KEY (match_id, kind))"
+            )
+        self.active = None
+        self.active_fp = None
+
+    def segments(self):
+        return sorted(fn for fn in os.listdir(self.path) if fn.endswith(SEGMENT_SUFFIX))
+
+    def _segment_for_write(self, size):
+        if self.active_fp is not None and self.active_fp.tell() + size > SEGMENT_MAX_BYTES:
+            self.seal()
+        if self.active_fp is None:
+            self.active = f"{time.time_ns()}{SEGMENT_SUFFIX}"
+            self.active_fp = open(os.path.join(self.path, self.active), "ab")
+        return self.active_fp
+
+    def seal(self):
+        """Close the active segment, the next write starts a new one."""
+        if self.active_fp is not None:
+            self.active_fp.close()
+        self.active = self.active_fp = None
+
+    def append(self, match_id, match_details, match_timeline=None):
+        records = [(MATCH, match_details)]
+        if match_timeline:
+            records.append((TIMELINE, match_timeline))
+        encoded_id = match_id.encode("utf-8")
+        with self.lock:
+            rows = []
+            for kind, data in records:
+                raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                payload = compress(raw)
+                header = RECORD_HEADER.pack(RECORD_MAGIC, kind, len(encoded_id), len(payload), len(raw))
+                fp = self._segment_for_write(len(header) + len(encoded_id) + len(payload))
+                offset = fp.tell() + len(header) + len(encoded_id)
+                fp.write(header + encoded_id + payload)
+                rows.append((match_id, kind, self.active, offset, len(payload), len(raw)))
+            # The index only points to data that is already on disk
+            self.active_fp.flush()
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _ref(self, row):
+        match_id, kind, segment, offset, length, raw_size = row
+        return RecordRef(match_id, kind, os.path.join(self.path, segment), offset, length, raw_size)
+
+    def ref(self, match_id, kind):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT match_id, kind, segment, offset, length, raw_size FROM records WHERE match_id = ? AND kind = ?",
+                (match_id, kind)
+            ).fetchone()
+        return self._ref(row) if row else None
+
+    def has_match(self, match_id):
+        """True if both the details and the timeline of match_id are stored."""
+        with self.lock:
+            count = self.connection.execute("SELECT COUNT(*) FROM records WHERE match_id = ?", (match_id,)).fetchone()[0]
+        return count == 2
+
+    def get(self, match_id, kind=MATCH):
+        ref = self.ref(match_id, kind)
+        return read_record(ref) if ref else None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM records WHERE kind = ?", (TIMELINE,)).fetchone()[0]
+
+    def pairs(self):
+        """(match_ref, timeline_ref) of every stored match, in the order they were written."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT match_id, kind, segment, offset, length, raw_size FROM records ORDER BY segment, offset"
+            ).fetchall()
+        refs = {}
+        order = []
+        for row in rows:
+            ref = self._ref(row)
+            if ref.match_id not in refs:
+                order.append(ref.match_id)
+            refs.setdefault(ref.match_id, {})[ref.kind] = ref
+        return [
+            (refs[match_id][MATCH], refs[match_id][TIMELINE])
+            for match_id in order
+            if MATCH in refs[match_id] and TIMELINE in refs[match_id]
+        ]
+
+    def rebuild_index(self):
+        """Index every record found in the segment files (after a crash or a manual copy)."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM records")
+                for segment in self.segments():
+                    self.connection.executemany(
+                        "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (match_id, kind, segment, offset, length, raw_size)
+                            for match_id, kind, offset, length, raw_size in iter_segment(os.path.join(self.path, segment))
+                        ]
+                    )
+
+    def rotate(self, backup_folder=BACKUP_FOLDER):
+        """
+        Take every segment out of the archive, moving it whole into backup_folder if that
+        folder exists or deleting it otherwise, and start over with an empty index.
+        """
+        with self.lock:
+            self.seal()
+            backup = os.path.isdir(backup_folder)
+            if backup:
+                backup_path = os.path.join(backup_folder, self.path)
+                os.makedirs(backup_path, exist_ok=True)
+            for segment in self.segments():
+                if backup:
+                    shutil.move(os.path.join(self.path, segment), os.path.join(backup_path, segment))
+                else:
+                    os.remove(os.path.join(self.path, segment))
+            with self.connection:
+                self.connection.execute("DELETE FROM records")
+
+    def close(self):
+        with self.lock:
+            self.seal()
+            self.connection.close()
+
+_ARCHIVES = {}
+_ARCHIVES_LOCK = threading.Lock()
+_ARCHIVES_PID = os.getpid()
+# Archives inherited through fork, kept referenced so their connections are never closed in the child
+_INHERITED = []
+
+def get_match_archive(origin):
+    """Archive of an origin, opened once per process (a forked child opens its own)."""
+    global _ARCHIVES_LOCK, _ARCHIVES_PID
+    if _ARCHIVES_PID != os.getpid():
+        # The lock may have been held by another thread of the parent when it forked
+        _ARCHIVES_LOCK = threading.Lock()
+        _INHERITED.extend(_ARCHIVES.values())
+        _ARCHIVES.clear()
+        _ARCHIVES_PID = os.getpid()
+    with _ARCHIVES_LOCK:
+        if origin not in _ARCHIVES:
+            _ARCHIVES[origin] = MatchArchive(origin)
+        return _ARCHIVES[origin]
+
+def archived_origins(folder=ARCHIVE_FOLDER):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(fn for fn in os.listdir(folder) if os.path.isdir(os.path.join(folder, fn)))
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+MATCH_INDEX_PATH = os.path.join("features", "matches.db")
+LEGACY_CHECKED_PATH = os.path.join("features", "checked.json")
+
+# Match statuses, in the order a match goes through them
+FETCHED = "fetched"
+EXTRACTED = "extracted"
+# Matches that will never be used
+INVALID = "invalid"
+OUTDATED = "outdated"
+
+class MatchIndex:
+    """
+    Persistent index of every match seen by the crawler or the feature extractor,
+    with its status and the player_info origin it was found through.
+    Shared by get_matches and extract_features instead of checked.json.
+    """
+    def __init__(self, path=MATCH_INDEX_PATH):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS matches (
+                    match_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    origin TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Last crawl step finished for each player of an origin, so a crawl resumes per player
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_progress (
+                    origin TEXT NOT NULL,
+                    puuid TEXT NOT NULL,
+                    step INTEGER NOT NULL,
+                    valid INTEGER,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (origin, puuid)
+                )
+            """)
+        self._migrate_checked()
+
+    def _migrate_checked(self):
+        # Imports the old checked.json list once, then it is no longer read
+        if not os.path.exists(LEGACY_CHECKED_PATH):
+            return
+        if self.connection.execute("SELECT 1 FROM matches LIMIT 1").fetchone():
+            return
+        with open(LEGACY_CHECKED_PATH, "r") as fp:
+            checked = json.load(fp)
+        print(f"Importing {len(checked)} checked matches into the match index")
+        self.mark(checked, EXTRACTED)
+
+    def status(self, match_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status, origin FROM matches WHERE match_id = ?", (match_id,)
+            ).fetchone()
+        return row if row else (None, None)
+
+    def is_extracted(self, match_id):
+        return self.status(match_id)[0] == EXTRACTED
+
+    def __contains__(self, match_id):
+        return self.status(match_id)[0] is not None
+
+    def mark(self, match_ids, status, origin=None):
+        """Set the status of one or more matches, keeping the origin already stored if none is given."""
+        if isinstance(match_ids, str):
+            match_ids = [match_ids]
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany("""
+                INSERT INTO matches (match_id, status, origin, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(match_id) DO UPDATE SET
+                    status = excluded.status,
+                    origin = COALESCE(excluded.origin, matches.origin),
+                    updated_at = excluded.updated_at
+            """, [(match_id, status, origin, now) for match_id in match_ids])
+
+    def ids(self, status=None):
+        with self.lock:
+            if status is None:
+                rows = self.connection.execute("SELECT match_id FROM matches")
+            else:
+                rows = self.connection.execute("SELECT match_id FROM matches WHERE status = ?", (status,))
+            return [row[0] for row in rows]
+
+    def mark_crawled(self, origin, puuid, step, valid):
+        """Record that step was crawled for a player, with the number of valid matches found (None if no matches)."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO crawl_progress (origin, puuid, step, valid, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (origin, puuid, step, valid, time.time())
+            )
+
+    def crawl_progress(self, origin):
+        """{puuid: (last crawled step, valid matches found in it)} of an origin."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT puuid, step, valid FROM crawl_progress WHERE origin = ?", (origin,)
+            ).fetchall()
+        return {puuid: (step, valid) for puuid, step, valid in rows}
+
+    def close(self):
+        self.connection.close()
+
+_MATCH_INDEX = None
+
+def get_match_index():
+    global _MATCH_INDEX
+    if _MATCH_INDEX is None:
+        _MATCH_INDEX = MatchIndex()
+    return _MATCH_INDEX
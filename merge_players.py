@@ -1,21 +1,54 @@
 import os
 import json
+from argparse import ArgumentParser
+from player_index import get_player_index, PLAYER_INFO_FOLDER, ALL_PLAYERS_PATH
 
-def main():
-    base_folder = "player_info"
-    output_path = os.path.join(base_folder, "all_players.json")
-    if os.path.exists(output_path):
-        os.remove(output_path)
-    all_player_info = {}
-    for info_folder in os.listdir(base_folder):
-        for info_file in os.listdir(os.path.join(base_folder, info_folder)):
-            with open(os.path.join(base_folder, info_folder, info_file), "r", encoding="UTF-8") as fp:
-                players = json.load(fp)
-            for p in players:
-                p["origin"] = f"{info_folder}/{info_file.replace('.json', '')}"
-                all_player_info[p["puuid"]] = p
-    with open(output_path, "w+", encoding="UTF-8") as fp:
-        json.dump(all_player_info, fp, ensure_ascii=False, indent=4)
+def player_files(base_folder=PLAYER_INFO_FOLDER):
+    """{path: origin} of every player_info/{folder}/{file}.json"""
+    files = {}
+    for info_folder in sorted(os.listdir(base_folder)):
+        if not os.path.isdir(os.path.join(base_folder, info_folder)):
+            continue
+        for info_file in sorted(os.listdir(os.path.join(base_folder, info_folder))):
+            if not info_file.endswith(".json"):
+                continue
+            files[os.path.join(base_folder, info_folder, info_file)] = f"{info_folder}/{info_file.replace('.json', '')}"
+    return files
+
+def export_players(index, output_path=ALL_PLAYERS_PATH):
+    """Write the merged players as all_players.json, one player at a time."""
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="UTF-8") as fp:
+        fp.write("{")
+        for i, (puuid, player) in enumerate(index.iter_players()):
+            fp.write(",\n" if i else "\n")
+            fp.write(f"{json.dumps(puuid)}: {json.dumps(player, ensure_ascii=False)}")
+        fp.write("\n}")
+    os.replace(tmp_path, output_path)
+    print(f"Data written to {output_path}")
+
+def main(export=False):
+    """Merge only the player files that changed since the last run into the player index."""
+    index = get_player_index()
+    files = player_files()
+    for path in index.sources():
+        if path not in files:
+            print(f"Removing players of {path}")
+            index.remove_source(path)
+    merged = 0
+    for path, origin in files.items():
+        if index.is_current(path):
+            continue
+        with open(path, "r", encoding="UTF-8") as fp:
+            players = json.load(fp)
+        index.merge_source(path, origin, players)
+        merged += 1
+    print(f"Merged {merged} of {len(files)} player files, {len(index)} players indexed")
+    if export:
+        export_players(index)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = ArgumentParser(description="Merge the player_info files into the player index.")
+    parser.add_argument('--export', action='store_true', help=f'Also write every merged player to {ALL_PLAYERS_PATH}')
+    args = parser.parse_args()
+    main(args.export)
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""
+Evaluation metrics of the README computed on whole arrays, in chunks of rows so that
+millions of predictions are scored in bounded memory.
+
+Predictions and labels are item id arrays, one row per sample, padded with 0 (empty
+slot). Set metrics ignore repeated ids in a row, sequence metrics expect the padding
+at the end of the row. evaluate also takes multi-hot scipy sparse matrices with the same
+columns, which only have the set metrics since their rows have no order.
+"""
+import numpy as np
+
+CHUNK_SIZE = 262144
+TOP_K = 6
+
+def top_k(scores, k=TOP_K):
+    """Indices of the k best scores of every row, best first."""
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+    return np.take_along_axis(best, order, axis=1)
+
+def top_k_items(scores, item_ids, k=TOP_K):
+    """Item ids of the k best scores of every row, item_ids maps an output index to its id."""
+    return np.asarray(item_ids)[top_k(scores, k)]
+
+def multi_hot_items(y, item_ids):
+    """Item id rows, padded with 0, of a multi-hot (n, items) label matrix."""
+    rows, cols = np.nonzero(np.asarray(y) > 0)
+    counts = np.bincount(rows, minlength=len(y))
+    items = np.zeros((len(y), max(counts.max(initial=0), 1)), dtype=np.int64)
+    # nonzero returns each row's columns in order, so a row's n-th one goes to slot n
+    slots = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    items[rows, slots] = np.asarray(item_ids)[cols]
+    return items
+
+def _as_items(items):
+    items = np.asarray(items)
+    if items.ndim == 1:
+        items = items[:, None]
+    return np.nan_to_num(items.astype(np.float64), nan=0).astype(np.int64) if items.dtype.kind == "f" else items.astype(np.int64)
+
+def first_occurrences(items):
+    """Mask of the non empty slots holding an id for the first time in their row."""
+    items = _as_items(items)
+    repeated = np.triu(items[:, :, None] == items[:, None, :], k=1).any(axis=1)
+    return (items != 0) & ~repeated
+
+def _hits(predictions, labels):
+    """Items as int arrays, plus the masks of the counted predictions, labels and hits."""
+    predictions = _as_items(predictions)
+    labels = _as_items(labels)
+    valid_predictions = first_occurrences(predictions)
+    valid_labels = first_occurrences(labels)
+    hit = ((predictions[:, :, None] == labels[:, None, :]) & valid_labels[:, None, :]).any(axis=2) & valid_predictions
+    return predictions, labels, valid_predictions, valid_labels, hit
+
+def match_counts(predictions, labels):
+    """(hits, predicted, true) per row: |pred & true|, |pred| and |true| as sets."""
+    _, _, valid_predictions, valid_labels, hit = _hits(predictions, labels)
+    return hit.sum(axis=1), valid_predictions.sum(axis=1), valid_labels.sum(axis=1)
+
+def sparse_match_counts(predicted, true):
+    """match_counts of multi-hot scipy sparse matrices with the same columns."""
+    hits = np.asarray(predicted.multiply(true).sum(axis=1)).ravel()
+    return hits, np.asarray(predicted.sum(axis=1)).ravel(), np.asarray(true.sum(axis=1)).ravel()
+
+def sparse_class_counts(predicted, true):
+    """class_counts of multi-hot scipy sparse matrices, indexed by column instead of item id."""
+    return (
+        np.asarray(predicted.multiply(true).sum(axis=0)).ravel(),
+        np.asarray(predicted.sum(axis=0)).ravel(),
+        np.asarray(true.sum(axis=0)).ravel(),
+    )
+
+def is_sparse(array):
+    return hasattr(array, "tocsr")
+
+def _ratio(numerator, denominator):
+    # zero_division=0, as in sklearn's precision_score and recall_score
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+def precision_at_k(predictions, labels):
+    """Per row |pred & true| / |pred| (Precision@6 with 6 predictions)."""
+    hits, predicted, _ = match_counts(predictions, labels)
+    return _ratio(hits, predicted)
+
+def recall_at_k(predictions, labels):
+    """Per row |pred & true| / |true| (Recall@6, the notebooks' single slot accuracy)."""
+    hits, _, true = match_counts(predictions, labels)
+    return _ratio(hits, true)
+
+def all_slots_correct(predictions, labels):
+    """Per row, 1 if every true item is among the predictions (rows without labels are 0)."""
+    hits, _, true = match_counts(predictions, labels)
+    return ((hits == true) & (true > 0)).astype(np.float64)
+
+def class_counts(predictions, labels):
+    """Per item id: (true positives, predicted, true) counts, as arrays indexed by id."""
+    predictions, labels, valid_predictions, valid_labels, hit = _hits(predictions, labels)
+    size = int(max(predictions.max(initial=0), labels.max(initial=0))) + 1
+    return (
+        np.bincount(predictions[hit], minlength=size),
+        np.bincount(predictions[valid_predictions], minlength=size),
+        np.bincount(labels[valid_labels], minlength=size),
+    )
+
+def _add_counts(total, counts):
+    if total is None:
+        return list(counts)
+    size = max(len(total[0]), len(counts[0]))
+    return [np.pad(t, (0, size - len(t))) + np.pad(c, (0, size - len(c))) for t, c in zip(total, counts)]
+
+def f1_scores(tp, predicted, true):
+    """(micro F1, macro F1) from class_counts, macro over the items seen in either side."""
+    fp = predicted - tp
+    fn = true - tp
+    micro = 2 * tp.sum() / max(2 * tp.sum() + fp.sum() + fn.sum(), 1)
+    seen = (predicted + true) > 0
+    per_class = _ratio(2 * tp[seen], 2 * tp[seen] + fp[seen] + fn[seen])
+    macro = per_class.mean() if len(per_class) else 0.0
+    return float(micro), float(macro)
+
+def sequence_lengths(items):
+    return (_as_items(items) != 0).sum(axis=1)
+
+def item_match_rate(predictions, labels):
+    """Per row, the share of predicted items that appear anywhere in the true build."""
+    predictions = _as_items(predictions)
+    labels = _as_items(labels)
+    valid = predictions != 0
+    found = ((predictions[:, :, None] == labels[:, None, :]) & (labels != 0)[:, None, :]).any(axis=2) & valid
+    return _ratio(found.sum(axis=1), valid.sum(axis=1))
+
+def relaxed_order_score(predictions, labels):
+    """
+    Per row, the mean over predicted items of 1 - |i - j| / length, with i the predicted
+    position, j the nearest position of the same item in the true build and length the
+    longest of both sequences. Items missing from the true build score 0.
+    """
+    predictions = _as_items(predictions)
+    labels = _as_items(labels)
+    valid = predictions != 0
+    same = (predictions[:, :, None] == labels[:, None, :]) & (labels != 0)[:, None, :]
+    offsets = np.abs(np.arange(predictions.shape[1])[:, None] - np.arange(labels.shape[1])[None, :])
+    distance = np.where(same, offsets[None, :, :], np.iinfo(np.int64).max).min(axis=2)
+    length = np.maximum(valid.sum(axis=1), sequence_lengths(labels))[:, None]
+    score = np.where(same.any(axis=2) & valid, 1 - distance / np.maximum(length, 1), 0)
+    return _ratio(score.sum(axis=1), valid.sum(axis=1))
+
+def edit_distance(predictions, labels):
+    """Per row Levenshtein distance between the two sequences, one DP step for all rows at once."""
+    predictions = _as_items(predictions)
+    labels = _as_items(labels)
+    n, k = predictions.shape
+    m = labels.shape[1]
+    table = np.empty((n, k + 1, m + 1), dtype=np.int32)
+    table[:, 0, :] = np.arange(m + 1)
+    table[:, :, 0] = np.arange(k + 1)
+    for i in range(1, k + 1):
+        for j in range(1, m + 1):
+            substitution = table[:, i - 1, j - 1] + (predictions[:, i - 1] != labels[:, j - 1])
+            table[:, i, j] = np.minimum(np.minimum(table[:, i - 1, j], table[:, i, j - 1]) + 1, substitution)
+    rows = np.arange(n)
+    return table[rows, sequence_lengths(predictions), sequence_lengths(labels)]
+
+def normalized_edit_distance(predictions, labels):
+    """Per row edit distance over the length of the longest sequence (0 when both are empty)."""
+    length = np.maximum(sequence_lengths(predictions), sequence_lengths(labels))
+    return _ratio(edit_distance(predictions, labels), length)
+
+def group_sums(values, groups):
+    """(group ids, sum of each values column, row count) of every group."""
+    unique, inverse = np.unique(np.asarray(groups), return_inverse=True)
+    sums = np.stack([np.bincount(inverse, weights=column, minlength=len(unique)) for column in values.T], axis=1)
+    return unique, sums, np.bincount(inverse, minlength=len(unique))
+
+def per_match_mean(values, match_ids):
+    """Mean of the per row values of each match, then over the matches."""
+    _, sums, counts = group_sums(np.asarray(values, dtype=np.float64)[:, None], match_ids)
+    return float((sums[:, 0] / counts).mean()) if len(counts) else 0.0
+
+SEQUENCE_METRICS = {
+    "item_match_rate": item_match_rate,
+    "relaxed_order_score": relaxed_order_score,
+    "normalized_edit_distance": normalized_edit_distance,
+}
+
+def iter_chunks(*arrays, chunk_size=CHUNK_SIZE):
+    # Sparse matrices have no len
+    length = arrays[0].shape[0] if is_sparse(arrays[0]) else len(arrays[0])
+    for start in range(0, length, chunk_size):
+        yield tuple(None if array is None else array[start:start + chunk_size] for array in arrays)
+
+def evaluate_chunks(chunks):
+    """
+    Every metric over (predictions, labels) or (predictions, labels, match_ids) chunks,
+    e.g. read from a dataset one row group at a time. With match ids, the sequence
+    metrics are also averaged per match first. Chunks of scipy sparse multi-hot rows
+    only give the set metrics.
+    """
+    rows = 0
+    sums = np.zeros(3)
+    sequence_sums = np.zeros(len(SEQUENCE_METRICS))
+    counts = None
+    groups = []
+    kinds = set()
+    for chunk in chunks:
+        predictions, labels = chunk[:2]
+        match_ids = chunk[2] if len(chunk) > 2 else None
+        sparse = is_sparse(predictions)
+        if sparse != is_sparse(labels):
+            raise ValueError("predictions and labels must both be sparse matrices or both be item arrays")
+        # Sparse class counts are indexed by column and dense ones by item id, they can't be added up
+        kinds.add(sparse)
+        if len(kinds) > 1:
+            raise ValueError("chunks mix sparse matrices and item arrays")
+        if sparse:
+            hits, predicted, true = sparse_match_counts(predictions, labels)
+            counts = _add_counts(counts, sparse_class_counts(predictions, labels))
+        else:
+            hits, predicted, true = match_counts(predictions, labels)
+            counts = _add_counts(counts, class_counts(predictions, labels))
+            sequence = np.stack([metric(predictions, labels) for metric in SEQUENCE_METRICS.values()], axis=1)
+            sequence_sums += sequence.sum(axis=0)
+            if match_ids is not None:
+                groups.append(group_sums(sequence, match_ids))
+        sums += [_ratio(hits, predicted).sum(), _ratio(hits, true).sum(), ((hits == true) & (true > 0)).sum()]
+        rows += len(hits)
+    means = sums / max(rows, 1)
+    results = {
+        "rows": rows,
+        f"precision@{TOP_K}": float(means[0]),
+        f"recall@{TOP_K}": float(means[1]),
+        "all_slots_accuracy": float(means[2]),
+    }
+    if True not in kinds:
+        # Sequence metrics need the ordered item arrays
+        results.update({name: float(value) for name, value in zip(SEQUENCE_METRICS, sequence_sums / max(rows, 1))})
+    if counts is not None:
+        results["micro_f1"], results["macro_f1"] = f1_scores(*counts)
+    if groups:
+        # A match can be split across chunks, its partial sums are merged first
+        ids = np.concatenate([group[0] for group in groups])
+        unique, inverse = np.unique(ids, return_inverse=True)
+        match_sums = np.stack([
+            np.bincount(inverse, weights=np.concatenate([group[1][:, i] for group in groups]), minlength=len(unique))
+            for i in range(len(SEQUENCE_METRICS))
+        ], axis=1)
+        match_rows = np.bincount(inverse, weights=np.concatenate([group[2] for group in groups]), minlength=len(unique))
+        per_match = (match_sums / match_rows[:, None]).mean(axis=0)
+        results.update({f"{name}_per_match": float(value) for name, value in zip(SEQUENCE_METRICS, per_match)})
+    return results
+
+def evaluate(predictions, labels, match_ids=None, chunk_size=CHUNK_SIZE):
+    """Every metric of the README for whole prediction and label arrays."""
+    return evaluate_chunks(iter_chunks(predictions, labels, match_ids, chunk_size=chunk_size))
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+from common import file_hash
+
+PLAYER_INFO_FOLDER = "player_info"
+ALL_PLAYERS_PATH = os.path.join(PLAYER_INFO_FOLDER, "all_players.json")
+PLAYER_INDEX_PATH = os.path.join(PLAYER_INFO_FOLDER, "all_players.db")
+MMAP_SIZE = 256 * 1024 ** 2
+
+class PlayerIndex:
+    """
+    Player metadata keyed by puuid, stored in a memory-mapped SQLite file, so every run
+    (and every extraction worker) shares it instead of parsing JSON again. merge_players
+    upserts each player_info file into it, keeping every origin a player was found in.
+    Stores that were never merged are still built from all_players.json when it changes.
+    """
+    def __init__(self, path=PLAYER_INDEX_PATH, source_path=ALL_PLAYERS_PATH):
+        self.path = path
+        self.source_path = source_path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS players (puuid TEXT PRIMARY KEY, tier TEXT, data TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # One row per player and origin file, players holds the merged view of them
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS player_origins ("
+                "puuid TEXT NOT NULL, origin TEXT NOT NULL, data TEXT NOT NULL, ingested_at INTEGER NOT NULL, "
+                "PRIMARY KEY (puuid, origin))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS player_origins_origin ON player_origins (origin)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sources ("
+                "path TEXT PRIMARY KEY, origin TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL)"
+            )
+        self.refresh()
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self):
+        """Rebuild the index if all_players.json changed since it was last built."""
+        if not os.path.exists(self.source_path) or self._meta("merged"):
+            return
+        source_mtime = str(os.stat(self.source_path).st_mtime_ns)
+        if self._meta("source_mtime") == source_mtime:
+            return
+        print(f"Indexing players from {self.source_path}")
+        with open(self.source_path, "r", encoding="UTF-8") as fp:
+            all_players = json.load(fp)
+        with self.connection:
+            self.connection.execute("DELETE FROM players")
+            self.connection.executemany(
+                "INSERT INTO players (puuid, tier, data) VALUES (?, ?, ?)",
+                [
+                    (puuid, player.get("tier"), json.dumps(player, ensure_ascii=False))
+                    for puuid, player in all_players.items()
+                ]
+            )
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source_mtime', ?)", (source_mtime,))
+
+    def is_current(self, path):
+        """True if path was merged and its content didn't change since."""
+        row = self.connection.execute("SELECT size, mtime_ns, hash FROM sources WHERE path = ?", (path,)).fetchone()
+        if row is None or not os.path.exists(path):
+            return False
+        size, mtime_ns, source_hash = row
+        stat = os.stat(path)
+        if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+            return True
+        # Touched but maybe not changed, the hash decides
+        if stat.st_size == size and file_hash(path) == source_hash:
+            with self.connection:
+                self.connection.execute("UPDATE sources SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, path))
+            return True
+        return False
+
+    def sources(self):
+        return dict(self.connection.execute("SELECT path, origin FROM sources").fetchall())
+
+    def _origin_puuids(self, origin):
+        return [row[0] for row in self.connection.execute("SELECT puuid FROM player_origins WHERE origin = ?", (origin,))]
+
+    def _rebuild_players(self, puuids):
+        # The data of the most recently merged origin wins, as later files used to overwrite earlier ones
+        for puuid in set(puuids):
+            rows = self.connection.execute(
+                "SELECT origin, data FROM player_origins WHERE puuid = ? ORDER BY ingested_at, rowid", (puuid,)
+            ).fetchall()
+            if not rows:
+                self.connection.execute("DELETE FROM players WHERE puuid = ?", (puuid,))
+                continue
+            origin, data = rows[-1]
+            player = json.loads(data)
+            player["origin"] = origin
+            player["origins"] = [row[0] for row in rows]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO players (puuid, tier, data) VALUES (?, ?, ?)",
+                (puuid, player.get("tier"), json.dumps(player, ensure_ascii=False))
+            )
+
+    def merge_source(self, path, origin, players):
+        """Replace what origin contributed with players, read from the file at path."""
+        stat = os.stat(path)
+        source_hash = file_hash(path)
+        ingested_at = time.time_ns()
+        with self.connection:
+            if not self._meta("merged"):
+                # Players that only came from all_players.json are replaced by the merged ones
+                self.connection.execute("DELETE FROM players")
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('merged', '1')")
+            affected = self._origin_puuids(origin)
+            self.connection.execute("DELETE FROM player_origins WHERE origin = ?", (origin,))
+            rows = {}
+            for player in players:
+                data = {key: value for key, value in player.items() if key not in ("origin", "origins")}
+                rows[player["puuid"]] = (player["puuid"], origin, json.dumps(data, ensure_ascii=False), ingested_at)
+            self.connection.executemany("INSERT INTO player_origins VALUES (?, ?, ?, ?)", rows.values())
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                (path, origin, stat.st_size, stat.st_mtime_ns, source_hash)
+            )
+            self._rebuild_players(affected + list(rows))
+
+    def remove_source(self, path):
+        """Forget the players of a file that no longer exists."""
+        row = self.connection.execute("SELECT origin FROM sources WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        with self.connection:
+            affected = self._origin_puuids(row[0])
+            self.connection.execute("DELETE FROM player_origins WHERE origin = ?", (row[0],))
+            self.connection.execute("DELETE FROM sources WHERE path = ?", (path,))
+            self._rebuild_players(affected)
+
+    def iter_players(self):
+        for puuid, data in self.connection.execute("SELECT puuid, data FROM players ORDER BY puuid"):
+            yield puuid, json.loads(data)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def get(self, puuid):
+        row = self.connection.execute("SELECT data FROM players WHERE puuid = ?", (puuid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, puuid):
+        return self.connection.execute("SELECT 1 FROM players WHERE puuid = ?", (puuid,)).fetchone() is not None
+
+    def first_tier(self, puuids):
+        """Tier of the first puuid found in the index, following the order of puuids."""
+        placeholders = ", ".join("?" * len(puuids))
+        tiers = dict(self.connection.execute(
+            f"SELECT puuid, tier FROM players WHERE puuid IN ({placeholders})", list(puuids)
+        ).fetchall())
+        for puuid in puuids:
+            if puuid in tiers:
+                return tiers[puuid]
+        return None
+
+    def close(self):
+        self.connection.close()
+
+_PLAYER_INDEX = None
+_PLAYER_INDEX_PID = None
+# Connections inherited through fork, kept referenced so they are never closed in the child
+_INHERITED = []
+
+def get_player_index():
+    """Player index of the current process, opened on first use and again after a fork."""
+    global _PLAYER_INDEX, _PLAYER_INDEX_PID
+    if _PLAYER_INDEX is not None and _PLAYER_INDEX_PID != os.getpid():
+        # A SQLite connection can't be used across fork, closing it would drop the parent's locks
+        _INHERITED.append(_PLAYER_INDEX)
+        _PLAYER_INDEX = None
+    if _PLAYER_INDEX is None:
+        _PLAYER_INDEX = PlayerIndex()
+        _PLAYER_INDEX_PID = os.getpid()
+    return _PLAYER_INDEX
+
+_PLAYER_FILES = {}
+
+def load_player_file(path):
+    """Players listed in a player_info file, only parsed again when the file changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _PLAYER_FILES.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="UTF-8") as fp:
+            cached = (mtime, json.load(fp))
+        _PLAYER_FILES[path] = cached
+    return [dict(player) for player in cached[1]]
@@ -0,0 +1,168 @@
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()  # .env
+
+CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "cache")
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+VOLATILE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 24 * 60 * 60))
+
+# Finished matches never change, so their payloads are kept until evicted
+IMMUTABLE_PATTERNS = [
+    re.compile(r"/lol/match/v5/matches/[^/]+/timeline$"),
+    re.compile(r"/lol/match/v5/matches/[^/]+$"),
+]
+
+def get_ttl(url):
+    """Seconds a cached url stays valid, None if it never expires."""
+    path = url.split("?")[0]
+    for pattern in IMMUTABLE_PATTERNS:
+        if pattern.search(path):
+            return None
+    return VOLATILE_TTL
+
+def cache_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response, built from a cache entry."""
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = {}
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+class ResponseCache:
+    """
+    On-disk cache of response bodies keyed by the hash of their url. Bodies are
+    stored gzip compressed and the least recently used entries are evicted once
+    the cache grows past max_bytes.
+    """
+    def __init__(self, folder=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.entries = None  # key -> [size, last access]
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.gz")
+
+    def _scan(self):
+        # Built lazily from the files, their mtime is the last access
+        entries = {}
+        total_bytes = 0
+        if not os.path.isdir(self.folder):
+            return entries, total_bytes
+        for sub_folder in os.listdir(self.folder):
+            sub_path = os.path.join(self.folder, sub_folder)
+            if not os.path.isdir(sub_path):
+                continue
+            for fn in os.listdir(sub_path):
+                if not fn.endswith(".gz"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(sub_path, fn))
+                except FileNotFoundError:
+                    continue
+                entries[fn[:-3]] = [stat.st_size, stat.st_mtime]
+                total_bytes += stat.st_size
+        return entries, total_bytes
+
+    def _load_index(self):
+        if self.entries is not None:
+            return
+        # The directory walk runs without the lock, only the finished index is swapped in under it
+        entries, total_bytes = self._scan()
+        with self.lock:
+            if self.entries is None:
+                self.entries = entries
+                self.total_bytes = total_bytes
+
+    def _remove(self, key):
+        size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _discard(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def get(self, url):
+        key = cache_key(url)
+        path = self._path(key)
+        self._load_index()
+        with self.lock:
+            if key not in self.entries:
+                return None
+        # Reading and decompressing happen outside the lock, so cache hits are served concurrently
+        try:
+            with gzip.open(path, "rb") as fp:
+                meta = json.loads(fp.readline())
+                content = fp.read()
+        except (OSError, ValueError):
+            self._discard(key)
+            return None
+        ttl = get_ttl(url)
+        if ttl is not None and meta["stored_at"] + ttl < time.time():
+            self._discard(key)
+            return None
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            # Evicted by another thread since it was read
+            pass
+        with self.lock:
+            if key in self.entries:
+                self.entries[key][1] = now
+        return CachedResponse(url, meta["status_code"], content)
+
+    def put(self, url, response):
+        key = cache_key(url)
+        path = self._path(key)
+        meta = {"url": url, "status_code": response.status_code, "stored_at": time.time()}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb") as fp:
+            fp.write(json.dumps(meta).encode("utf-8") + b"\n")
+            fp.write(response.content)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        self._load_index()
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries[key][0]
+            self.entries[key] = [size, time.time()]
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Frees some extra space so eviction doesn't run again on every put
+        target = self.max_bytes * 0.9
+        for key in sorted(self.entries, key=lambda k: self.entries[k][1]):
+            if self.total_bytes <= target:
+                break
+            self._remove(key)
+
+CACHE = ResponseCache()
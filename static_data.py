@@ -0,0 +1,154 @@
+import os
+import json
+import pickle
+from functools import lru_cache
+import numpy as np
+from http_client import get
+from item_catalog import ItemCatalog
+from get_game_data import get_champion_data, get_item_data, get_rune_data
+
+GAME_DATA_FOLDER = "game_data"
+# Name of the active patch, written by update_snapshot
+CURRENT_VERSION_FILE = os.path.join(GAME_DATA_FOLDER, "current")
+# Files directly in game_data, from before snapshots were kept per patch
+LOCAL_VERSION = "local"
+SNAPSHOT_FILES = ("champions.json", "items.json", "perks.json")
+PREPARSED_FILE = "static_data.pkl"
+VERSIONS_URL = "https://ddragon.leagueoflegends.com/api/versions.json"
+
+def snapshot_folder(version):
+    if version == LOCAL_VERSION:
+        return GAME_DATA_FOLDER
+    return os.path.join(GAME_DATA_FOLDER, version)
+
+def has_snapshot(version):
+    return all(os.path.exists(os.path.join(snapshot_folder(version), fn)) for fn in SNAPSHOT_FILES)
+
+def latest_version():
+    response = get(VERSIONS_URL)
+    if response.status_code != 200:
+        return None
+    return response.json()[0]
+
+def current_version():
+    """Patch used when none is asked for: $GAME_DATA_VERSION, then game_data/current."""
+    version = os.getenv("GAME_DATA_VERSION")
+    if version:
+        return version
+    if os.path.exists(CURRENT_VERSION_FILE):
+        with open(CURRENT_VERSION_FILE, "r", encoding="utf-8") as fp:
+            return fp.read().strip()
+    if has_snapshot(LOCAL_VERSION):
+        return LOCAL_VERSION
+    return None
+
+def download_snapshot(version):
+    """Fetch the latest game data into game_data/{version}. Returns False if any download failed."""
+    folder = snapshot_folder(version)
+    os.makedirs(folder, exist_ok=True)
+    print(f"Fetching game data for patch {version}")
+    return all([
+        get_champion_data(clean=False, folder=folder),
+        get_item_data(clean=False, folder=folder),
+        get_rune_data(clean=False, folder=folder),
+    ])
+
+def update_snapshot():
+    """Make the latest patch the current one, downloading it if it has no snapshot yet."""
+    version = latest_version()
+    if version is None:
+        print(f"Couldn't fetch the latest patch from {VERSIONS_URL}")
+        return None
+    if not has_snapshot(version) and not download_snapshot(version):
+        return None
+    with open(CURRENT_VERSION_FILE, "w", encoding="utf-8") as fp:
+        fp.write(version)
+    return version
+
+def _source_stats(folder):
+    stats = {}
+    for fn in SNAPSHOT_FILES:
+        stat = os.stat(os.path.join(folder, fn))
+        stats[fn] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+def _preparse(folder):
+    with open(os.path.join(folder, "champions.json"), "r", encoding="utf-8") as fp:
+        champions = json.load(fp)
+    with open(os.path.join(folder, "items.json"), "r", encoding="utf-8") as fp:
+        items = json.load(fp)
+    with open(os.path.join(folder, "perks.json"), "r", encoding="utf-8") as fp:
+        perks = json.load(fp)
+    # Same order as the JSON files, which the feature columns rely on
+    return {
+        "sources": _source_stats(folder),
+        "champion_names": list(champions.keys()),
+        "champion_ids": np.array([info["id"] for info in champions.values()], dtype=np.int64),
+        "champion_icons": [info.get("icon") for info in champions.values()],
+        "item_info": items,
+        "perk_ids": np.array([int(perk_id) for perk_id in perks.keys()], dtype=np.int64),
+        "perk_names": [info["name"] for info in perks.values()],
+    }
+
+def load_tables(folder):
+    """Lookup tables of a snapshot, parsed from its JSON once and then read from a pickle."""
+    path = os.path.join(folder, PREPARSED_FILE)
+    if os.path.exists(path):
+        with open(path, "rb") as fp:
+            tables = pickle.load(fp)
+        if tables["sources"] == _source_stats(folder):
+            return tables
+    tables = _preparse(folder)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fp:
+        pickle.dump(tables, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return tables
+
+class StaticData:
+    """
+    Champions, items and perks of one patch. Each kind has an ids array and a names list
+    in file order, so a row index maps to an id and a name, plus dicts for the other ways round.
+    """
+    def __init__(self, version, tables):
+        self.version = version
+        self.champion_names = tables["champion_names"]
+        self.champion_ids = tables["champion_ids"]
+        self.champion_icons = dict(zip(self.champion_names, tables["champion_icons"]))
+        self.champion_index = {name: i for i, name in enumerate(self.champion_names)}
+        self.champion_id_index = {int(champion_id): i for i, champion_id in enumerate(self.champion_ids)}
+        self.champion_name_to_id = {name: int(champion_id) for name, champion_id in zip(self.champion_names, self.champion_ids)}
+        self.champion_id_to_name = {int(champion_id): name for name, champion_id in zip(self.champion_names, self.champion_ids)}
+        self.item_catalog = ItemCatalog(tables["item_info"])
+        self.item_ids = np.array(list(self.item_catalog.info.keys()), dtype=np.int64)
+        self.item_index = {int(item_id): i for i, item_id in enumerate(self.item_ids)}
+        self.perk_ids = tables["perk_ids"]
+        self.perk_names = tables["perk_names"]
+        self.perk_index = {int(perk_id): i for i, perk_id in enumerate(self.perk_ids)}
+
+    def champion_name(self, champion_id):
+        return self.champion_id_to_name.get(champion_id)
+
+    def champion_id(self, champion_name):
+        return self.champion_name_to_id.get(champion_name)
+
+    def item_name(self, item_id):
+        return self.item_catalog.name(item_id)
+
+    def perk_id_to_name(self):
+        """{str_id: {"name": name}}, the layout of perks.json."""
+        return {str(perk_id): {"name": name} for perk_id, name in zip(self.perk_ids, self.perk_names)}
+
+@lru_cache(maxsize=None)
+def load_static_data(version):
+    # The CDNs only serve the latest data, so a missing past patch can't be downloaded again
+    if not has_snapshot(version):
+        raise FileNotFoundError(f"No game data snapshot for patch {version}, run get_game_data.py")
+    return StaticData(version, load_tables(snapshot_folder(version)))
+
+def get_static_data(version=None):
+    """Game data of a patch (the current one by default), loaded once per process."""
+    version = version or current_version() or update_snapshot()
+    if version is None:
+        raise FileNotFoundError("No game data snapshot, run get_game_data.py")
+    return load_static_data(version)
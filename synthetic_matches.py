@@ -0,0 +1,455 @@
+"""
+Synthetic match-v5 and timeline-v5 JSON, for measuring the pipeline without crawled data.
+
+Every match is consistent with itself the way extract_match checks it: the postgame
+kills, deaths, assists, gold, level and analysed items are the ones the timeline replay
+ends with. Item churn covers the events the replay handles separately: ITEM_UNDO of
+purchases and of sales, components and consumables ITEM_DESTROYED, upgradable boots,
+the support item quest (3866 -> 3867 -> one of SUPPORT_ITEMS) and item events of
+participant 0.
+"""
+import os
+import json
+import random
+from item_catalog import ITEM_UPGRADES, SUPPORT_QUEST_ITEM, SUPPORT_ITEMS
+
+GAME_VERSION = "15.11.1"
+FRAME_INTERVAL = 60000
+MINUTES = 30
+# Spread of the game length around MINUTES
+MINUTES_JITTER = 5
+EVENTS_PER_MINUTE = 40
+ITEM_CHURN = 0.2
+LANES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER"]
+SUPPORT_STARTER = 3866
+BASIC_BOOTS = 1001
+POTION = 2003
+TRINKET = 3340
+MONSTERS = ["DRAGON", "DRAGON", "HORDE", "RIFTHERALD", "BARON_NASHOR", "ATAKHAN"]
+WARDS = ["YELLOW_TRINKET", "CONTROL_WARD", "SIGHT_WARD", "BLUE_TRINKET"]
+# Minute the support quest items are completed, as (3866 -> 3867, 3867 -> support item)
+SUPPORT_QUEST_MINUTES = (7, 14)
+CHAMPION_STATS = [
+    "abilityHaste", "abilityPower", "armor", "armorPen", "armorPenPercent", "attackDamage", "attackSpeed",
+    "bonusArmorPenPercent", "bonusMagicPenPercent", "ccReduction", "cooldownReduction", "health", "healthMax",
+    "healthRegen", "lifesteal", "magicPen", "magicPenPercent", "magicResist", "movementSpeed", "omnivamp",
+    "physicalVamp", "power", "powerMax", "powerRegen", "spellVamp",
+]
+DAMAGE_STATS = [
+    "magicDamageDone", "magicDamageDoneToChampions", "magicDamageTaken", "physicalDamageDone",
+    "physicalDamageDoneToChampions", "physicalDamageTaken", "totalDamageDone", "totalDamageDoneToChampions",
+    "totalDamageTaken", "trueDamageDone", "trueDamageDoneToChampions", "trueDamageTaken",
+]
+# Postgame stats that nothing reads, so a match weighs about as much as a real one
+POSTGAME_STATS = [
+    "baronKills", "champExperience", "damageDealtToBuildings", "damageDealtToObjectives", "damageSelfMitigated",
+    "detectorWardsPlaced", "doubleKills", "dragonKills", "goldSpent", "killingSprees", "largestKillingSpree",
+    "largestMultiKill", "longestTimeSpentLiving", "magicDamageDealt", "magicDamageDealtToChampions",
+    "neutralMinionsKilled", "physicalDamageDealt", "physicalDamageDealtToChampions", "timeCCingOthers",
+    "totalDamageDealt", "totalDamageDealtToChampions", "totalDamageTaken", "totalHeal", "totalTimeSpentDead",
+    "trueDamageDealt", "turretKills", "visionScore", "visionWardsBoughtInGame", "wardsKilled", "wardsPlaced",
+]
+
+def synthetic_game_data(folder, champions=170, legendaries=110, components=60, perks=63, seed=0):
+    """
+    Write champions.json, items.json and perks.json with about as many entries as a real
+    patch, including the boots, support and consumable items the generator relies on.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    champion_data = {
+        f"Champion{i}": {"id": i, "name": f"Champion {i}", "icon": ""}
+        for i in rng.sample(range(1, 1000), champions)
+    }
+
+    def item(item_id, tier, rank):
+        return {"id": item_id, "name": f"Item {item_id}", "tier": tier, "rank": rank, "icon": ""}
+
+    items = {str(BASIC_BOOTS): item(BASIC_BOOTS, 1, ["BASIC"]), str(POTION): item(POTION, 1, ["CONSUMABLE"]),
+             str(TRINKET): item(TRINKET, 1, ["TRINKET"])}
+    for item_id in rng.sample(range(1020, 1999), components):
+        items[str(item_id)] = item(item_id, 1, ["BASIC"])
+    for item_id in (1054, 1055, 1056, 1083):
+        items[str(item_id)] = item(item_id, 1, ["STARTER"])
+    for item_id in (3006, 3009, 3020, 3047, 3111, 3158) + tuple(ITEM_UPGRADES)[:4]:
+        items[str(item_id)] = item(item_id, 2, ["BOOTS"])
+    items[str(SUPPORT_STARTER)] = item(SUPPORT_STARTER, 2, ["STARTER"])
+    for item_id in (SUPPORT_QUEST_ITEM,) + SUPPORT_ITEMS + tuple(set(ITEM_UPGRADES.values()) - {SUPPORT_QUEST_ITEM}):
+        items[str(item_id)] = item(item_id, 3, ["LEGENDARY"])
+    taken = {int(item_id) for item_id in items}
+    for item_id in rng.sample([i for i in range(3000, 8000) if i not in taken], legendaries):
+        items[str(item_id)] = item(item_id, 3, ["LEGENDARY"])
+    perk_data = {str(perk_id): {"name": f"Perk {perk_id}"} for perk_id in rng.sample(range(5000, 9999), perks)}
+
+    for fn, data in (("champions.json", champion_data), ("items.json", items), ("perks.json", perk_data)):
+        with open(os.path.join(folder, fn), "w", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False, indent=4)
+
+def item_pools(item_catalog):
+    """Analysed and untracked item ids of a catalog, split by how the generator buys them."""
+    analysed = item_catalog.analysed
+    special = set(ITEM_UPGRADES) | set(ITEM_UPGRADES.values()) | set(SUPPORT_ITEMS) | {SUPPORT_QUEST_ITEM}
+    pools = {
+        "legendary": [i for i in item_catalog.analysed_ids if item_catalog.tier[i] >= 3 and i not in special],
+        "boots": [i for i in item_catalog.analysed_ids if "BOOTS" in item_catalog.rank[i] and i not in special],
+        "upgradable_boots": [i for i in ITEM_UPGRADES if i != SUPPORT_STARTER and i in analysed and ITEM_UPGRADES[i] in analysed],
+        "starter": [i for i in item_catalog.analysed_ids if "STARTER" in item_catalog.rank[i] and i not in special],
+        "component": [i for i in item_catalog.info if i not in analysed and item_catalog.tier[i] <= 2 and i not in special],
+        "support_items": [i for i in SUPPORT_ITEMS if i in analysed],
+    }
+    # The quest is only played when every step is tracked, otherwise the postgame items wouldn't match
+    pools["support_quest"] = SUPPORT_STARTER in analysed and SUPPORT_QUEST_ITEM in analysed and bool(pools["support_items"])
+    return pools
+
+class MatchGenerator:
+    """
+    Random matches of a patch. Each match only depends on its seed, so the same
+    (match_id, seed) pair always gives the same JSON.
+    """
+    def __init__(self, static_data, minutes=MINUTES, events_per_minute=EVENTS_PER_MINUTE, item_churn=ITEM_CHURN,
+                 minutes_jitter=MINUTES_JITTER, version=GAME_VERSION):
+        self.champions = list(zip((int(i) for i in static_data.champion_ids), static_data.champion_names))
+        self.perks = [int(perk_id) for perk_id in static_data.perk_ids]
+        self.pools = item_pools(static_data.item_catalog)
+        self.minutes = minutes
+        self.minutes_jitter = minutes_jitter
+        self.events_per_minute = events_per_minute
+        self.item_churn = item_churn
+        self.version = version
+
+    def generate(self, match_id, seed=0):
+        """(match, timeline) dicts, as returned by get_match_details and get_match_timeline."""
+        return _MatchSimulation(self, match_id, random.Random(seed)).run()
+
+class _MatchSimulation:
+    def __init__(self, generator, match_id, rng):
+        self.generator = generator
+        self.pools = generator.pools
+        self.match_id = match_id
+        self.rng = rng
+        self.players = {}
+        for participant_id, (champion_id, champion_name) in enumerate(rng.sample(generator.champions, 10), start=1):
+            self.players[participant_id] = {
+                "championId": champion_id, "championName": champion_name,
+                "teamId": 100 if participant_id <= 5 else 200, "lane": LANES[(participant_id - 1) % 5],
+                "kills": 0, "deaths": 0, "assists": 0, "level": 1, "xp": 0, "totalGold": 500, "currentGold": 500,
+                "minionsKilled": 0, "jungleMinionsKilled": 0, "skills": [0, 0, 0, 0], "items": [],
+                "perks": rng.sample(generator.perks, min(6, len(generator.perks))),
+            }
+        self.events = []
+        self.frame_end = 0
+
+    # Items
+    def _emit(self, event_type, timestamp, participant_id, **fields):
+        self.events.append({"type": event_type, "timestamp": timestamp, "participantId": participant_id, **fields})
+
+    def _later(self, timestamp, delay):
+        # Events stay in the frame they happened in
+        return min(timestamp + delay, self.frame_end)
+
+    def _destroy(self, timestamp, participant_id, item_id):
+        self.players[participant_id]["items"].remove(item_id)
+        self._emit("ITEM_DESTROYED", timestamp, participant_id, itemId=item_id)
+
+    def _buy(self, timestamp, participant_id, item_id, components=()):
+        player = self.players[participant_id]
+        for component in components:
+            self._destroy(timestamp, participant_id, component)
+        player["items"].append(item_id)
+        self._emit("ITEM_PURCHASED", timestamp, participant_id, itemId=item_id)
+        if self.rng.random() < self.generator.item_churn / 2:
+            # Undone right away, the components come back
+            player["items"].remove(item_id)
+            player["items"].extend(components)
+            self._emit("ITEM_UNDO", self._later(timestamp, 1), participant_id, beforeId=item_id, afterId=0, goldGain=300)
+
+    def _sell(self, timestamp, participant_id):
+        player = self.players[participant_id]
+        sellable = [i for i in player["items"] if i not in (SUPPORT_STARTER, SUPPORT_QUEST_ITEM) and i not in SUPPORT_ITEMS]
+        if not sellable:
+            return
+        item_id = self.rng.choice(sellable)
+        player["items"].remove(item_id)
+        self._emit("ITEM_SOLD", timestamp, participant_id, itemId=item_id)
+        if self.rng.random() < self.generator.item_churn / 2:
+            player["items"].append(item_id)
+            self._emit("ITEM_UNDO", self._later(timestamp, 1), participant_id, beforeId=0, afterId=item_id, goldGain=-300)
+
+    def _shop(self, timestamp, participant_id, minute):
+        player = self.players[participant_id]
+        rng = self.rng
+        held = player["items"]
+        owned_components = [i for i in held if i in self.pools["component"]]
+        upgraded_boots = {ITEM_UPGRADES[i] for i in self.pools["upgradable_boots"]}
+        has_boots = any(i in self.pools["boots"] or i in self.pools["upgradable_boots"] or i in upgraded_boots for i in held)
+        roll = rng.random()
+        if roll < self.generator.item_churn * 0.25:
+            self._sell(timestamp, participant_id)
+        elif roll < 0.15:
+            # Consumables are bought and used up without ever being tracked
+            self._emit("ITEM_PURCHASED", timestamp, participant_id, itemId=POTION)
+            self._emit("ITEM_DESTROYED", self._later(timestamp, rng.randint(1000, 30000)), participant_id, itemId=POTION)
+        elif not has_boots and minute >= 3 and (BASIC_BOOTS in held or len(held) < 6):
+            boots = self.pools["boots"] + self.pools["upgradable_boots"]
+            if BASIC_BOOTS in held and boots:
+                self._buy(timestamp, participant_id, rng.choice(boots), [BASIC_BOOTS])
+            elif BASIC_BOOTS not in held:
+                self._buy(timestamp, participant_id, BASIC_BOOTS)
+        elif roll < 0.55 and len(held) < 6 and self.pools["component"]:
+            self._buy(timestamp, participant_id, rng.choice(self.pools["component"]))
+        elif owned_components or len(held) < 6:
+            choices = [i for i in self.pools["legendary"] if i not in held]
+            if choices:
+                components = rng.sample(owned_components, min(len(owned_components), rng.randint(1, 2)))
+                self._buy(timestamp, participant_id, rng.choice(choices), components)
+        else:
+            self._sell(timestamp, participant_id)
+
+    def _upgrade_items(self, timestamp, participant_id, minute):
+        player = self.players[participant_id]
+        for item_id in list(player["items"]):
+            upgrade = ITEM_UPGRADES.get(item_id)
+            if item_id in self.pools["upgradable_boots"] and minute >= 20 and self.rng.random() < 0.2:
+                self._destroy(timestamp, participant_id, item_id)
+                player["items"].append(upgrade)
+            elif item_id == SUPPORT_STARTER and self.pools["support_quest"] and minute >= SUPPORT_QUEST_MINUTES[0]:
+                self._destroy(timestamp, participant_id, item_id)
+                player["items"].append(upgrade)
+            elif item_id == SUPPORT_QUEST_ITEM and minute >= SUPPORT_QUEST_MINUTES[1]:
+                self._destroy(timestamp, participant_id, item_id)
+                player["items"].append(self.rng.choice(self.pools["support_items"]))
+
+    # Other events
+    def _damage(self, participant_ids):
+        return [{
+            "basic": self.rng.random() < 0.5, "magicDamage": self.rng.randint(0, 900), "name": self.players[p]["championName"],
+            "participantId": p, "physicalDamage": self.rng.randint(0, 900), "spellName": "spell", "spellSlot": self.rng.randint(0, 3),
+            "trueDamage": self.rng.randint(0, 100), "type": "OTHER",
+        } for p in participant_ids]
+
+    def _kill(self, timestamp, participant_id):
+        rng = self.rng
+        team = self.players[participant_id]["teamId"]
+        victim = rng.choice([p for p, info in self.players.items() if info["teamId"] != team])
+        assists = rng.sample([p for p, info in self.players.items() if info["teamId"] == team and p != participant_id], rng.randint(0, 3))
+        # Executed by a tower or a monster
+        killer = 0 if rng.random() < 0.04 else participant_id
+        if killer:
+            self.players[killer]["kills"] += 1
+            self.players[killer]["totalGold"] += 300
+        self.players[victim]["deaths"] += 1
+        for p in assists:
+            self.players[p]["assists"] += 1
+        event = {
+            "type": "CHAMPION_KILL", "timestamp": timestamp, "killerId": killer, "victimId": victim,
+            "bounty": 300, "killStreakLength": 0, "shutdownBounty": 0,
+            "position": {"x": rng.randint(0, 15000), "y": rng.randint(0, 15000)},
+            "victimDamageDealt": self._damage([killer or victim]),
+            "victimDamageReceived": self._damage([killer] + assists if killer else assists),
+        }
+        if assists:
+            event["assistingParticipantIds"] = assists
+        self.events.append(event)
+
+    def _level_up(self, timestamp, participant_id, minute):
+        player = self.players[participant_id]
+        if player["level"] >= min(18, 2 + minute * 0.7):
+            return
+        player["level"] += 1
+        self._emit("LEVEL_UP", timestamp, participant_id, level=player["level"])
+        slot = 4 if player["level"] in (6, 11, 16) else self.rng.choice([s for s in (1, 2, 3) if player["skills"][s - 1] < 5] or [1])
+        player["skills"][slot - 1] += 1
+        self._emit("SKILL_LEVEL_UP", timestamp, participant_id, skillSlot=slot, levelUpType="NORMAL")
+
+    def _event(self, timestamp, minute):
+        rng = self.rng
+        participant_id = rng.randint(1, 10)
+        team = self.players[participant_id]["teamId"]
+        kind = rng.random()
+        if kind < 0.3:
+            self._shop(timestamp, participant_id, minute)
+        elif kind < 0.4:
+            self._kill(timestamp, participant_id)
+        elif kind < 0.55:
+            self._level_up(timestamp, participant_id, minute)
+        elif kind < 0.57:
+            self.events.append({"type": "ELITE_MONSTER_KILL", "timestamp": timestamp, "killerId": participant_id,
+                                "killerTeamId": team, "monsterType": rng.choice(MONSTERS), "bounty": 0})
+        elif kind < 0.59:
+            self.events.append({"type": "BUILDING_KILL", "timestamp": timestamp, "killerId": rng.choice([0, participant_id]),
+                                "teamId": 300 - team, "buildingType": "TOWER_BUILDING", "laneType": "MID_LANE",
+                                "towerType": "OUTER_TURRET", "bounty": 0})
+        elif kind < 0.62:
+            self.events.append({"type": "TURRET_PLATE_DESTROYED", "timestamp": timestamp, "killerId": participant_id,
+                                "teamId": 300 - team, "laneType": "TOP_LANE"})
+        elif kind < 0.63:
+            # Item events that don't belong to a player, skipped by the replay
+            self._emit("ITEM_DESTROYED", timestamp, 0, itemId=rng.choice(self.pools["legendary"] or [POTION]))
+        elif kind < 0.8:
+            self.events.append({"type": "WARD_PLACED", "timestamp": timestamp, "creatorId": participant_id, "wardType": rng.choice(WARDS)})
+        else:
+            self.events.append({"type": "WARD_KILL", "timestamp": timestamp, "killerId": participant_id, "wardType": rng.choice(WARDS)})
+
+    # Frames
+    def _participant_frame(self, participant_id, minute):
+        rng = self.rng
+        player = self.players[participant_id]
+        return {
+            "championStats": {stat: rng.randint(0, 300) for stat in CHAMPION_STATS},
+            "currentGold": player["currentGold"],
+            "damageStats": {stat: rng.randint(0, 20000) * minute for stat in DAMAGE_STATS},
+            "goldPerSecond": 0,
+            "jungleMinionsKilled": player["jungleMinionsKilled"],
+            "level": player["level"],
+            "minionsKilled": player["minionsKilled"],
+            "participantId": participant_id,
+            "position": {"x": rng.randint(0, 15000), "y": rng.randint(0, 15000)},
+            "timeEnemySpentControlled": rng.randint(0, 50000),
+            "totalGold": player["totalGold"],
+            "xp": player["xp"],
+        }
+
+    def _grow(self, participant_id, span):
+        rng = self.rng
+        player = self.players[participant_id]
+        player["totalGold"] += int(rng.randint(250, 450) * span)
+        player["currentGold"] = rng.randint(0, 1500)
+        player["xp"] += int(rng.randint(300, 600) * span)
+        if player["lane"] == "JUNGLE":
+            player["jungleMinionsKilled"] += int(rng.randint(3, 6) * span)
+        elif player["lane"] != "UTILITY":
+            player["minionsKilled"] += int(rng.randint(4, 9) * span)
+
+    def run(self):
+        rng = self.rng
+        generator = self.generator
+        duration = max(FRAME_INTERVAL, int((generator.minutes + rng.uniform(-1, 1) * generator.minutes_jitter) * FRAME_INTERVAL))
+        timestamps = list(range(0, duration, FRAME_INTERVAL)) + [duration]
+
+        frames = []
+        previous = 0
+        for minute, timestamp in enumerate(timestamps):
+            self.events = []
+            self.frame_end = timestamp
+            if minute == 0:
+                self.events.append({"type": "PAUSE_END", "timestamp": 0, "realTimestamp": 1748000000000})
+            else:
+                start = previous + 1
+                if minute == 1:
+                    # Starting items are bought in the first seconds, before anything else happens
+                    for participant_id, player in self.players.items():
+                        starter = SUPPORT_STARTER if player["lane"] == "UTILITY" and self.pools["support_quest"] else \
+                            rng.choice(self.pools["starter"] or self.pools["component"])
+                        self._buy(rng.randint(1000, 15000), participant_id, starter)
+                        self._emit("ITEM_PURCHASED", rng.randint(1000, 15000), participant_id, itemId=POTION)
+                    start = 15001
+                span = (timestamp - previous) / FRAME_INTERVAL
+                # The last milliseconds of a frame are left to the item upgrades below
+                for event_time in sorted(rng.randint(start, timestamp - 2) for _ in range(int(generator.events_per_minute * span))):
+                    self._event(event_time, minute)
+                for participant_id in self.players:
+                    self._upgrade_items(timestamp - 1, participant_id, minute)
+                    self._grow(participant_id, span)
+            if timestamp == duration:
+                self.events.append({"type": "GAME_END", "timestamp": duration, "gameId": 0, "winningTeam": self.winning_team()})
+            self.events.sort(key=lambda event: event["timestamp"])
+            frames.append({
+                "events": self.events,
+                "participantFrames": {str(p): self._participant_frame(p, minute) for p in self.players},
+                "timestamp": timestamp,
+            })
+            previous = timestamp
+        return self.match(duration), self.timeline(frames)
+
+    def winning_team(self):
+        kills = {100: 0, 200: 0}
+        for player in self.players.values():
+            kills[player["teamId"]] += player["kills"]
+        return 100 if kills[100] >= kills[200] else 200
+
+    def puuid(self, participant_id):
+        return f"{self.match_id}-{participant_id}"
+
+    def match(self, duration):
+        rng = self.rng
+        winner = self.winning_team()
+        participants = []
+        for participant_id, player in self.players.items():
+            items = (player["items"] + [0] * 6)[:6] + [TRINKET]
+            participants.append({
+                "assists": player["assists"],
+                "champLevel": player["level"],
+                "championId": player["championId"],
+                "championName": player["championName"],
+                "deaths": player["deaths"],
+                "goldEarned": player["totalGold"],
+                "individualPosition": player["lane"],
+                **{f"item{i}": item_id for i, item_id in enumerate(items)},
+                "kills": player["kills"],
+                "participantId": participant_id,
+                "perks": {
+                    "statPerks": {"defense": 5011, "flex": 5008, "offense": 5005},
+                    "styles": [
+                        {"description": "primaryStyle", "selections": [{"perk": perk, "var1": 0, "var2": 0, "var3": 0} for perk in player["perks"][:4]], "style": 8000},
+                        {"description": "subStyle", "selections": [{"perk": perk, "var1": 0, "var2": 0, "var3": 0} for perk in player["perks"][4:]], "style": 8100},
+                    ],
+                },
+                "puuid": self.puuid(participant_id),
+                "riotIdGameName": f"Player{participant_id}",
+                "riotIdTagline": "BR1",
+                "teamEarlySurrendered": False,
+                "teamId": player["teamId"],
+                "teamPosition": player["lane"],
+                "totalMinionsKilled": player["minionsKilled"],
+                "win": player["teamId"] == winner,
+                **{stat: rng.randint(0, 50000) for stat in POSTGAME_STATS},
+            })
+        return {
+            "metadata": {"dataVersion": "2", "matchId": self.match_id, "participants": [p["puuid"] for p in participants]},
+            "info": {
+                "endOfGameResult": "GameComplete",
+                "gameCreation": 1748000000000,
+                "gameDuration": duration // 1000,
+                "gameId": int(self.match_id.split("_")[-1]) if self.match_id.split("_")[-1].isdigit() else 0,
+                "gameMode": "CLASSIC",
+                "gameType": "MATCHED_GAME",
+                "gameVersion": self.generator.version,
+                "mapId": 11,
+                "participants": participants,
+                "platformId": self.match_id.split("_")[0],
+                "queueId": 420,
+                "teams": [{"teamId": team, "win": team == winner} for team in (100, 200)],
+            },
+        }
+
+    def timeline(self, frames):
+        return {
+            "metadata": {"dataVersion": "2", "matchId": self.match_id, "participants": [self.puuid(p) for p in self.players]},
+            "info": {
+                "frameInterval": FRAME_INTERVAL,
+                "frames": frames,
+                "participants": [{"participantId": p, "puuid": self.puuid(p)} for p in self.players],
+            },
+        }
+
+def match_id(index, platform="BR1"):
+    return f"{platform}_{index}"
+
+def write_matches(generator, count, matches_dir, timelines_dir, seed=0):
+    """
+    Write count matches as {match_id}_matches.json and {match_id}_timeline.json, the files
+    extract_features reads. Returns {puuid: tier} of every player, for the player index.
+    """
+    os.makedirs(matches_dir, exist_ok=True)
+    os.makedirs(timelines_dir, exist_ok=True)
+    tiers = {}
+    for i in range(count):
+        match, timeline = generator.generate(match_id(i), seed=seed * 1000003 + i)
+        with open(os.path.join(matches_dir, f"{match_id(i)}_matches.json"), "w", encoding="utf-8") as fp:
+            json.dump(match, fp, ensure_ascii=False, indent=4)
+        with open(os.path.join(timelines_dir, f"{match_id(i)}_timeline.json"), "w", encoding="utf-8") as fp:
+            json.dump(timeline, fp, ensure_ascii=False, indent=4)
+        tier = random.Random(i).choice(TIERS)
+        tiers.update({puuid: tier for puuid in match["metadata"]["participants"]})
+    return tiers
@@ -0,0 +1,659 @@
+"""
+Vectorized version of the build_timeline_dataset.ipynb pipeline (load_timeline_files,
+generate_timeframe_rows, expand_participants, keep_valid_matches, add_stats_cols,
+expand_match and keep_high_performance). Whole batches are handled as
+(timeframe, participant) arrays instead of one pandas object per row, and the
+resulting rows are the same as the notebook's.
+"""
+import os
+import json
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from static_data import get_static_data
+from dataset_manifest import DatasetManifest, MANIFEST_FILE
+from timeline_format import STAT_FIELDS, SKILL_SLOTS, is_compact, encode_match, load_timeline_features, read_timeline_parquet
+
+LANES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+TEAMS = [100, 200]
+LIST_SIZE = {"items": 6, "perks": 6, "skills": 4}
+OBJECTIVES_COLS = ["voidgrubKills", "atakhanKills", "baronKills", "dragonKills", "structuresKilled", "heraldKills"]
+RANKS = [None, "IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
+KEPT_PLAYER_COLS = [
+    "kda", "level", "goldEarned", "relativeGold",
+    "minionsKilled", "participantId", "origin"
+] + [
+    f"items_{i}" for i in range(LIST_SIZE["items"])
+] + [
+    f"skills_{i}" for i in range(LIST_SIZE["skills"])
+]
+TEAMMATE_STATS = ["kda", "level", "minionsKilled"]
+# keep the top ~70% of the matches
+HIGH_PERFORMANCE_INDICATORS = {
+    "TOP": {"kda": 1.25, "relativeGold": 0.175},
+    "JUNGLE": {"kda": 1.75, "relativeGold": 0.175},
+    "MIDDLE": {"kda": 1.25, "relativeGold": 0.175},
+    "BOTTOM": {"kda": 1.75, "relativeGold": 0.175},
+    "UTILITY": {"kda": 1.75, "relativeGold": 0.125},
+}
+STAT_INDEX = {field: i for i, field in enumerate(STAT_FIELDS)}
+
+class FeatureSchema:
+    """One-hot columns of a training row (BASE_OHE_DICT in the notebook) and their lookups."""
+    def __init__(self, champion_names, champion_id_to_name, perk_ids, item_ids):
+        self.champion_names = list(champion_names)
+        self.champion_id_to_name = champion_id_to_name
+        self.ohe_columns = [
+            f"{prefix}_{name}"
+            for prefix in ["player", "ally", "enemy"]
+            for name in self.champion_names
+        ] + [
+            f"perk_{perk}" for perk in perk_ids
+        ] + [
+            f"item_{item}" for item in item_ids
+        ]
+        self.ohe_index = {column: i for i, column in enumerate(self.ohe_columns)}
+
+@lru_cache(maxsize=None)
+def load_feature_schema(version=None):
+    static_data = get_static_data(version)
+    return FeatureSchema(
+        static_data.champion_names,
+        static_data.champion_id_to_name,
+        [str(perk_id) for perk_id in static_data.perk_ids],
+        [str(item_id) for item_id in static_data.item_catalog.analysed_ids],
+    )
+
+def _pad(values, size):
+    values = list(values)[:size]
+    return values + [0] * (size - len(values))
+
+def _iter_compact_matches(filepaths):
+    for path in filepaths:
+        if path.endswith(".parquet"):
+            yield from _parquet_to_compact(read_timeline_parquet(path))
+            continue
+        for match_id, match_timeline in load_timeline_features(path, decode=False).items():
+            yield match_id, match_timeline if is_compact(match_timeline) else encode_match(match_timeline)
+
+def _parquet_to_compact(df):
+    static_fields = ["participantId", "championId", "teamId", "lane", "perks", "tier", "championName", "origin"]
+    for match_id, match_df in df.groupby("matchId", sort=False, observed=True):
+        match_df = match_df.sort_values(["timeframe", "participantId"], kind="stable")
+        timestamps = match_df["timeframe"].unique()
+        first = match_df[match_df["timeframe"] == timestamps[0]]
+        stats = np.column_stack(
+            [match_df[field].to_numpy(dtype=np.int64) for field in STAT_FIELDS] +
+            [np.stack(match_df["skills"].to_numpy()).astype(np.int64)]
+        )
+        yield match_id, {
+            "timestamps": timestamps.tolist(),
+            "static": [
+                {field: row[field] for field in static_fields}
+                for row in first[static_fields].to_dict("records")
+            ],
+            "stats": stats.reshape(len(timestamps), -1, stats.shape[1]),
+            "items": match_df["items"].to_numpy().reshape(len(timestamps), -1).tolist(),
+        }
+
+def load_frames(filepaths):
+    """
+    Load timeline feature files (compact/old JSON or Parquet) into arrays with one row per
+    timeframe and one column per participantId (1 to 10), like expand_participants.
+    """
+    match_ids, timeframes = [], []
+    stats, items, static = [], [], []
+    for match_id, match_timeline in _iter_compact_matches(filepaths):
+        participant_ids = [int(info["participantId"]) for info in match_timeline["static"]]
+        if sorted(participant_ids) != list(range(1, 11)):
+            continue
+        order = np.argsort(participant_ids)
+        match_stats = np.asarray(match_timeline["stats"], dtype=np.int64)[:, order]
+        match_items = np.array([
+            [_pad(frame_items[i], LIST_SIZE["items"]) for i in order]
+            for frame_items in match_timeline["items"]
+        ], dtype=np.int64).reshape(len(match_stats), 10, LIST_SIZE["items"])
+        n_frames = len(match_stats)
+        match_ids.extend([match_id] * n_frames)
+        timeframes.extend(int(ts) for ts in match_timeline["timestamps"])
+        stats.append(match_stats)
+        items.append(match_items)
+        static.append(([match_timeline["static"][i] for i in order], n_frames))
+    if not stats:
+        return None
+
+    def static_column(field, pad=None):
+        values = []
+        for participants, n_frames in static:
+            row = [_pad(p[field], pad) if pad else p[field] for p in participants]
+            values.extend([row] * n_frames)
+        return values
+
+    stats = np.concatenate(stats)
+    return {
+        "matchId": np.array(match_ids, dtype=object),
+        "timeframe": np.array(timeframes, dtype=np.int64),
+        "stats": stats[:, :, :len(STAT_FIELDS)],
+        "skills": stats[:, :, len(STAT_FIELDS):len(STAT_FIELDS) + SKILL_SLOTS],
+        "items": np.concatenate(items),
+        "perks": np.array(static_column("perks", LIST_SIZE["perks"]), dtype=np.int64),
+        "championId": np.array(static_column("championId"), dtype=np.int64),
+        "championName": np.array(static_column("championName"), dtype=object),
+        "teamId": np.array(static_column("teamId"), dtype=np.int64),
+        "lane": np.array(static_column("lane"), dtype=object),
+        "tier": np.array(static_column("tier"), dtype=object),
+        "origin": np.array(static_column("origin"), dtype=object),
+    }
+
+def _filter(frames, mask):
+    return {key: values[mask] for key, values in frames.items()}
+
+def keep_valid_matches(frames):
+    """Timeframes with two players on each lane, one from each team."""
+    lane_index = np.full(frames["lane"].shape, -1)
+    for i, lane in enumerate(LANES):
+        lane_index[frames["lane"] == lane] = i
+    valid = np.ones(len(lane_index), dtype=bool)
+    for i in range(len(LANES)):
+        valid &= (lane_index == i).sum(axis=1) == 2
+        # The notebook fails on a team without one player per lane, here the match is skipped
+        for team in TEAMS:
+            valid &= ((lane_index == i) & (frames["teamId"] == team)).sum(axis=1) == 1
+    frames = _filter(frames, valid)
+    frames["laneIndex"] = lane_index[valid]
+    return frames
+
+def add_stats_cols(frames):
+    stats = frames["stats"]
+    kills = stats[:, :, STAT_INDEX["kills"]]
+    deaths = stats[:, :, STAT_INDEX["deaths"]]
+    assists = stats[:, :, STAT_INDEX["assists"]]
+    gold = stats[:, :, STAT_INDEX["goldEarned"]]
+    frames["kda"] = (kills + assists) / np.where(deaths == 0, 1, deaths)
+    team_gold = {team: np.where(frames["teamId"] == team, gold, 0).sum(axis=1) for team in TEAMS}
+    player_team_gold = np.where(frames["teamId"] == 100, team_gold[100][:, None], team_gold[200][:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_gold = gold / player_team_gold
+    # NaN (a team without gold) becomes 0, as the notebook's fillna(0) does
+    frames["relativeGold"] = np.where(np.isnan(relative_gold), 0.0, relative_gold)
+    return frames
+
+def _row_columns(schema, lane, extra_columns):
+    """Columns of a row built by the notebook's build_new_row, in the order they are inserted."""
+    columns = list(schema.ohe_columns) + KEPT_PLAYER_COLS + ["tier"] + extra_columns
+    player_lane = LANES.index(lane)
+    ally_index = 0
+    for enemy_index in range(len(LANES)):
+        for feature in TEAMMATE_STATS:
+            if enemy_index != player_lane:
+                columns.append(f"ally_{ally_index}_{feature}")
+            columns.append(f"enemy_{enemy_index}_{feature}")
+        if enemy_index != player_lane:
+            ally_index += 1
+    for feature in OBJECTIVES_COLS:
+        columns += [f"ally_{feature}", f"enemy_{feature}"]
+    return columns + [lane, "matchId", "timeframe"]
+
+class SparseRows:
+    """
+    Training rows with the one-hot columns (champions, perks and items) stored as CSR arrays:
+    the one-hot columns set in row i are ohe_columns[indices[indptr[i]:indptr[i + 1]]].
+    Every other column is kept in the numeric DataFrame.
+    """
+    def __init__(self, numeric, indptr, indices, ohe_columns, columns, float_columns=()):
+        self.numeric = numeric
+        self.indptr = indptr
+        self.indices = indices
+        self.ohe_columns = list(ohe_columns)
+        # Column order of the dense rows
+        self.columns = list(columns)
+        # One-hot columns that are float in the dense rows (the notebook's fillna(0) on missing keys)
+        self.float_columns = set(float_columns)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def take(self, rows, numeric=None, columns=None):
+        """Rows in the given order, numeric can be passed when it was already reordered."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        if numeric is None:
+            numeric = self.numeric.iloc[rows].reset_index(drop=True)
+        return SparseRows(numeric, indptr, self.indices[positions], self.ohe_columns,
+                          columns or self.columns, self.float_columns)
+
+    def row_of(self, positions):
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))[positions]
+
+    def to_scipy(self):
+        from scipy.sparse import csr_matrix
+        data = np.ones(len(self.indices), dtype=np.float32)
+        return csr_matrix((data, self.indices, self.indptr), shape=(len(self), len(self.ohe_columns)))
+
+    def to_dense(self):
+        """The same DataFrame build_batch returns."""
+        ohe = np.zeros((len(self), len(self.ohe_columns)), dtype=np.int64)
+        ohe[self.row_of(slice(None)), self.indices] = 1
+        columns = {}
+        for i, column in enumerate(self.ohe_columns):
+            columns[column] = ohe[:, i].astype(np.float64) if column in self.float_columns else ohe[:, i]
+        for column in self.numeric.columns:
+            columns[column] = self.numeric[column].to_numpy()
+        return pd.DataFrame({column: columns[column] for column in self.columns})
+
+    def embedding_bag_inputs(self, rows=None):
+        """
+        (indices, offsets) of the one-hot columns of rows, the input of torch.nn.EmbeddingBag
+        with mode="sum", which gives the same result as a Linear layer over the dense one-hot block.
+        """
+        sparse = self if rows is None else self.take(rows)
+        return sparse.indices.astype(np.int64), sparse.indptr[:-1].astype(np.int64)
+
+    def numeric_columns(self):
+        return [column for column in self.numeric.columns if pd.api.types.is_numeric_dtype(self.numeric[column])]
+
+    def numeric_matrix(self, rows=None, columns=None):
+        columns = columns or self.numeric_columns()
+        numeric = self.numeric[columns] if rows is None else self.numeric[columns].iloc[rows]
+        return numeric.to_numpy(dtype=np.float32)
+
+    def to_torch(self, rows=None, columns=None):
+        """(indices, offsets, numeric) tensors for a model with an EmbeddingBag input."""
+        import torch
+        indices, offsets = self.embedding_bag_inputs(rows)
+        return (
+            torch.from_numpy(indices),
+            torch.from_numpy(offsets),
+            torch.from_numpy(self.numeric_matrix(rows, columns)),
+        )
+
+def concat_sparse(parts):
+    """Rows of several SparseRows, one-hot columns missing from a part are treated as unset."""
+    ohe_columns = list(parts[0].ohe_columns)
+    ohe_index = {column: i for i, column in enumerate(ohe_columns)}
+    columns = list(parts[0].columns)
+    seen = set(columns)
+    indices, lengths, float_columns = [], [], set()
+    for part in parts:
+        for column in part.ohe_columns:
+            if column not in ohe_index:
+                ohe_index[column] = len(ohe_columns)
+                ohe_columns.append(column)
+        for column in part.columns:
+            if column not in seen:
+                seen.add(column)
+                columns.append(column)
+        remap = np.array([ohe_index[column] for column in part.ohe_columns], dtype=np.int64)
+        indices.append(remap[part.indices])
+        lengths.append(np.diff(part.indptr))
+        float_columns |= part.float_columns
+    indptr = np.zeros(sum(len(part) for part in parts) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(lengths), out=indptr[1:])
+    numeric = pd.concat([part.numeric for part in parts], ignore_index=True)
+    return SparseRows(numeric, indptr, np.concatenate(indices), ohe_columns, columns, float_columns)
+
+def expand_match_sparse(frames, schema):
+    """One row per player who bought an item in a timeframe, the one-hot columns as CSR."""
+    rows, players = np.nonzero(frames["stats"][:, :, STAT_INDEX["boughtItem"]] != 0)
+    n_rows = len(rows)
+    stats = frames["stats"]
+    team = frames["teamId"][rows, players]
+    lane = frames["laneIndex"][rows, players]
+    teammates = frames["teamId"][rows] == team[:, None]
+
+    # Participant index of the player of each team on each lane
+    lane_player = np.zeros((len(frames["teamId"]), len(TEAMS), len(LANES)), dtype=np.int64)
+    for t, team_id in enumerate(TEAMS):
+        for l in range(len(LANES)):
+            lane_player[:, t, l] = np.argmax((frames["teamId"] == team_id) & (frames["laneIndex"] == l), axis=1)
+    team_slot = np.where(team == 100, 0, 1)
+
+    # One-hot columns, extra ones are added for names missing from game_data (NaN when absent, as in the notebook)
+    ohe_columns = list(schema.ohe_columns)
+    extra_index = {}
+    ohe_rows, ohe_positions = [], []
+    def set_ohe(row_indices, names):
+        positions = []
+        for name in names:
+            position = schema.ohe_index.get(name)
+            if position is None:
+                position = extra_index.get(name)
+                if position is None:
+                    position = extra_index[name] = len(ohe_columns)
+                    ohe_columns.append(name)
+            positions.append(position)
+        ohe_rows.append(np.asarray(row_indices, dtype=np.int64))
+        ohe_positions.append(np.asarray(positions, dtype=np.int64))
+
+    row_range = np.arange(n_rows)
+    player_champions = [
+        f"player_{schema.champion_id_to_name.get(champion_id)}"
+        for champion_id in frames["championId"][rows, players]
+    ]
+    player_names = np.array([name[len("player_"):] for name in player_champions], dtype=str)
+    set_ohe(row_range, player_champions)
+    for p in range(10):
+        names = frames["championName"][rows, p]
+        ally = teammates[:, p] & (names.astype(str) != player_names)
+        set_ohe(row_range[ally], [f"ally_{name}" for name in names[ally]])
+    for p in range(10):
+        enemy = ~teammates[:, p]
+        set_ohe(row_range[enemy], [f"enemy_{name}" for name in frames["championName"][rows[enemy], p]])
+    perks = frames["perks"][rows, players]
+    for i in range(LIST_SIZE["perks"]):
+        set_ohe(row_range, [f"perk_{perk}" for perk in perks[:, i]])
+    items = frames["items"][rows, players]
+    for i in range(LIST_SIZE["items"]):
+        bought = items[:, i] > 0
+        set_ohe(row_range[bought], [f"item_{item}" for item in items[bought, i]])
+
+    ohe_rows = np.concatenate(ohe_rows)
+    ohe_positions = np.concatenate(ohe_positions)
+    # Keys not in BASE_OHE_DICT are inserted in the order build_new_row meets them
+    extra_order = [[] for _ in range(n_rows)]
+    is_extra = ohe_positions >= len(schema.ohe_columns)
+    for row, position in zip(ohe_rows[is_extra], ohe_positions[is_extra]):
+        if ohe_columns[position] not in extra_order[row]:
+            extra_order[row].append(ohe_columns[position])
+    # Repeated keys (two equal perks, allies with the same champion) are set once
+    keys = np.unique(ohe_rows * len(ohe_columns) + ohe_positions)
+    indices = keys % len(ohe_columns)
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // len(ohe_columns), minlength=n_rows), out=indptr[1:])
+    extra_counts = np.bincount(indices, minlength=len(ohe_columns))[len(schema.ohe_columns):]
+    float_columns = [
+        name for name, count in zip(ohe_columns[len(schema.ohe_columns):], extra_counts)
+        if count < n_rows
+    ]
+
+    columns = {}
+    columns["kda"] = frames["kda"][rows, players]
+    columns["level"] = stats[rows, players, STAT_INDEX["level"]]
+    columns["goldEarned"] = stats[rows, players, STAT_INDEX["goldEarned"]]
+    columns["relativeGold"] = frames["relativeGold"][rows, players]
+    columns["minionsKilled"] = stats[rows, players, STAT_INDEX["minionsKilled"]]
+    columns["participantId"] = players + 1
+    columns["origin"] = frames["origin"][rows, players]
+    for i in range(LIST_SIZE["items"]):
+        columns[f"items_{i}"] = items[:, i]
+    skills = frames["skills"][rows, players]
+    for i in range(LIST_SIZE["skills"]):
+        columns[f"skills_{i}"] = skills[:, i]
+    rank_index = {rank: i for i, rank in enumerate(RANKS)}
+    columns["tier"] = np.array([rank_index[tier] for tier in frames["tier"][rows, players]], dtype=np.int64)
+
+    # The notebook takes the "enemy" stats from the player's own team, kept as is for identical rows
+    values = {"kda": frames["kda"]}
+    for feature in TEAMMATE_STATS[1:]:
+        values[feature] = stats[:, :, STAT_INDEX[feature]]
+    for enemy_index in range(len(LANES)):
+        source = lane_player[rows, team_slot, enemy_index]
+        for feature in TEAMMATE_STATS:
+            columns[f"enemy_{enemy_index}_{feature}"] = values[feature][rows, source]
+    for ally_index in range(len(LANES) - 1):
+        ally_lane = ally_index + (ally_index >= lane)
+        source = lane_player[rows, team_slot, ally_lane]
+        for feature in TEAMMATE_STATS:
+            columns[f"ally_{ally_index}_{feature}"] = values[feature][rows, source]
+
+    # Objectives are the same for every player of a team, the notebook reads the first one
+    first_player = {team_id: np.argmax(frames["teamId"][rows] == team_id, axis=1) for team_id in TEAMS}
+    ally_first = np.where(team == 100, first_player[100], first_player[200])
+    enemy_first = np.where(team == 100, first_player[200], first_player[100])
+    for feature in OBJECTIVES_COLS:
+        columns[f"ally_{feature}"] = stats[rows, ally_first, STAT_INDEX[feature]]
+        columns[f"enemy_{feature}"] = stats[rows, enemy_first, STAT_INDEX[feature]]
+
+    # Lane columns are float when some rows are from another lane, as fillna(0) leaves them
+    for l, lane_name in enumerate(LANES):
+        if (lane == l).all():
+            columns[lane_name] = np.ones(n_rows, dtype=np.int64)
+        elif (lane == l).any():
+            columns[lane_name] = (lane == l).astype(np.float64)
+
+    columns["matchId"] = frames["matchId"][rows]
+    columns["timeframe"] = frames["timeframe"][rows]
+
+    # Same column order as concatenating the notebook's rows
+    order = []
+    seen = set()
+    signatures = set()
+    for row in range(n_rows):
+        signature = (lane[row], tuple(extra_order[row]))
+        if signature in signatures:
+            continue
+        signatures.add(signature)
+        for column in _row_columns(schema, LANES[lane[row]], extra_order[row]):
+            if column not in seen:
+                seen.add(column)
+                order.append(column)
+    order = sorted(order, key=lambda x: x not in ["matchId", "timeframe"])
+
+    numeric = pd.DataFrame({column: columns[column] for column in order if column in columns})
+    return SparseRows(numeric, indptr, indices, ohe_columns, order, float_columns)
+
+def expand_match(frames, schema):
+    """One row per player who bought an item in a timeframe, with the same columns as the notebook's expand_match."""
+    return expand_match_sparse(frames, schema).to_dense()
+
+def keep_high_performance(df):
+    """Keep every row of the players whose last timeframe passes HIGH_PERFORMANCE_INDICATORS."""
+    last_timeframe = df.groupby(["matchId", "participantId"])["timeframe"].transform("max")
+    latest_rows = df[df["timeframe"] == last_timeframe]
+    high = np.ones(len(latest_rows), dtype=bool)
+    lane = np.full(len(latest_rows), "", dtype=object)
+    for lane_name in LANES:
+        if lane_name in latest_rows:
+            lane[(latest_rows[lane_name] == 1).to_numpy()] = lane_name
+    for indicator in ["kda", "relativeGold"]:
+        minimum = np.array([HIGH_PERFORMANCE_INDICATORS[l][indicator] for l in lane])
+        high &= ~(latest_rows[indicator].to_numpy() < minimum)
+    filtered_participants = latest_rows.loc[high, ["matchId", "participantId"]] \
+        .drop_duplicates() \
+        .sort_values(["matchId", "participantId"], kind="stable")
+    return pd.merge(
+        filtered_participants,
+        df,
+        on=["matchId", "participantId"],
+        how="inner"
+    )
+
+def keep_high_performance_sparse(sparse):
+    row_column = "__row"
+    df = keep_high_performance(sparse.numeric.assign(**{row_column: np.arange(len(sparse))}))
+    rows = df.pop(row_column).to_numpy()
+    # The merge moves its keys to the front
+    keys = ["matchId", "participantId"]
+    columns = keys + [column for column in sparse.columns if column not in keys]
+    return sparse.take(rows, numeric=df, columns=columns)
+
+def build_batch(filepaths, schema=None, high_performance=True, sparse=False):
+    """
+    Training rows of a batch of timeline feature files, the body of the notebook's build_dataset.
+    With sparse=True a SparseRows is returned instead of the dense DataFrame.
+    """
+    schema = schema or load_feature_schema()
+    frames = load_frames(filepaths)
+    if frames is None:
+        return SparseRows(pd.DataFrame(), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                          schema.ohe_columns, []) if sparse else pd.DataFrame()
+    frames = keep_valid_matches(frames)
+    frames = add_stats_cols(frames)
+    rows = expand_match_sparse(frames, schema)
+    if high_performance and len(rows):
+        rows = keep_high_performance_sparse(rows)
+    return rows if sparse else rows.to_dense()
+
+# Parquet files of SparseRows keep the one-hot indices of each row in a list column
+SPARSE_COLUMN = "ohe"
+SPARSE_METADATA_KEY = b"timeline_dataset"
+# Rows per Parquet row group, the unit RowGroupDataset reads and caches
+ROW_GROUP_SIZE = 16384
+
+def write_sparse_parquet(path, sparse):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pandas(sparse.numeric, preserve_index=False)
+    ohe = pa.ListArray.from_arrays(pa.array(sparse.indptr, type=pa.int32()), pa.array(sparse.indices, type=pa.int32()))
+    table = table.append_column(SPARSE_COLUMN, ohe)
+    metadata = {
+        "ohe_columns": sparse.ohe_columns,
+        "columns": sparse.columns,
+        "float_columns": sorted(sparse.float_columns),
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        SPARSE_METADATA_KEY: json.dumps(metadata).encode("utf-8"),
+    })
+    pq.write_table(table, path, compression="zstd", row_group_size=ROW_GROUP_SIZE)
+
+def is_sparse_table(table):
+    return SPARSE_METADATA_KEY in (table.schema.metadata or {})
+
+def table_to_sparse(table):
+    metadata = json.loads(table.schema.metadata[SPARSE_METADATA_KEY])
+    ohe = table.column(SPARSE_COLUMN).combine_chunks()
+    numeric = table.drop([SPARSE_COLUMN]).to_pandas()
+    return SparseRows(
+        numeric,
+        ohe.offsets.to_numpy().astype(np.int64),
+        ohe.values.to_numpy().astype(np.int64),
+        metadata["ohe_columns"],
+        metadata["columns"],
+        metadata["float_columns"],
+    )
+
+def read_sparse_parquet(path):
+    import pyarrow.parquet as pq
+    return table_to_sparse(pq.read_table(path))
+
+def _shard_name(batch_files):
+    start_id = os.path.basename(batch_files[0]).replace("timeline_features_ID", "").split(".")[0]
+    end_id = os.path.basename(batch_files[-1]).replace("timeline_features_ID", "").split(".")[0]
+    return f"{start_id}_{end_id}.parquet"
+
+def build_dataset(file_list, out_path=os.path.join("features", "dataset", "timeline"), batch_size=4, sparse=False):
+    os.makedirs(out_path, exist_ok=True)
+    for start in range(0, len(file_list), batch_size):
+        batch_files = file_list[start:start + batch_size]
+        rows = build_batch(batch_files, sparse=sparse)
+        write_shard(os.path.join(out_path, _shard_name(batch_files)), rows)
+
+def write_shard(out_file, rows):
+    if isinstance(rows, SparseRows):
+        write_sparse_parquet(out_file, rows)
+    else:
+        rows.to_parquet(out_file, row_group_size=ROW_GROUP_SIZE)
+
+def build_incremental(file_list, out_path=os.path.join("features", "dataset", "timeline"), batch_size=4, sparse=False):
+    """
+    Build only the shards whose timeline feature files are new or changed since the last
+    build, as recorded in the DatasetManifest of out_path, and return the manifest.
+    """
+    manifest = DatasetManifest(out_path)
+    for fn in manifest.unknown_shards():
+        print(f"Ignoring {fn}, not in {MANIFEST_FILE}")
+    # Every source of a shard goes back to the queue when one of them changed
+    requeued = []
+    for shard in manifest.stale_shards(file_list):
+        requeued += manifest.remove_shard(shard)
+    pending = [path for path in file_list if not manifest.is_current(path)]
+    pending += [path for path in requeued if path not in pending and os.path.exists(path)]
+    manifest.save()
+    print(f"{len(file_list) - len(pending)} files up to date, building {len(pending)}")
+
+    os.makedirs(out_path, exist_ok=True)
+    for start in range(0, len(pending), batch_size):
+        batch_files = pending[start:start + batch_size]
+        shard = _shard_name(batch_files)
+        print(f"Starting processing from {batch_files[0]} up to {batch_files[-1]}")
+        try:
+            rows = build_batch(batch_files, sparse=sparse)
+            write_shard(os.path.join(out_path, shard), rows)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"Error when processing from {batch_files[0]} up to {batch_files[-1]}")
+            print(str(e))
+            continue
+        match_ids = rows.numeric["matchId"] if isinstance(rows, SparseRows) else rows.get("matchId", [])
+        manifest.add_shard(shard, batch_files, set(match_ids), len(rows))
+        # Saved after every shard, an interrupted build resumes from here
+        manifest.save()
+    return manifest
+
+class RowGroupDataset:
+    """
+    Random access to the rows of dataset Parquet files (dense or sparse) without reading a
+    file per sample: rows are located through the row group metadata, and whole row groups
+    are decoded once and kept in an LRU cache. Works as a map-style torch Dataset, and
+    __getitems__ fetches a whole batch with one read per row group.
+    """
+    def __init__(self, paths, cache_size=8):
+        import pyarrow.parquet as pq
+        self.paths = list(paths)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.groups = []
+        starts = [0]
+        for path in self.paths:
+            metadata = pq.ParquetFile(path).metadata
+            for group in range(metadata.num_row_groups):
+                self.groups.append((path, group))
+                starts.append(starts[-1] + metadata.row_group(group).num_rows)
+        self.starts = np.array(starts, dtype=np.int64)
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def _row_group(self, group):
+        rows = self.cache.get(group)
+        if rows is not None:
+            self.cache.move_to_end(group)
+            return rows
+        import pyarrow.parquet as pq
+        path, row_group = self.groups[group]
+        table = pq.ParquetFile(path).read_row_group(row_group)
+        rows = table_to_sparse(table) if is_sparse_table(table) else table.to_pandas()
+        self.cache[group] = rows
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return rows
+
+    def _locate(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError("dataset index out of range")
+        groups = np.searchsorted(self.starts, indices, side="right") - 1
+        return groups, indices - self.starts[groups]
+
+    def __getitems__(self, indices):
+        """
+        Rows at indices, in the same order, as a DataFrame (or SparseRows for sparse files).
+        With a DataLoader, pass collate_fn=lambda batch: batch to keep the batch as is.
+        """
+        groups, local = self._locate(indices)
+        order = np.argsort(groups, kind="stable")
+        parts = []
+        for group in np.unique(groups):
+            rows = self._row_group(int(group))
+            selected = local[order][groups[order] == group]
+            parts.append(rows.take(selected) if isinstance(rows, SparseRows) else rows.iloc[selected])
+        restore = np.argsort(order, kind="stable")
+        if parts and isinstance(parts[0], SparseRows):
+            return concat_sparse(parts).take(restore)
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, ignore_index=True).iloc[restore].reset_index(drop=True)
+
+    def __getitem__(self, idx):
+        rows = self.__getitems__([idx])
+        if isinstance(rows, SparseRows):
+            rows = rows.to_dense()
+        return rows.iloc[0].to_dict()
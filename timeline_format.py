@@ -0,0 +1,144 @@
+import json
+
+COMPACT_FORMAT = "compact-v1"
+# Per participant values that change between frames, stored as one fixed-width row
+STAT_FIELDS = [
+    "kills", "deaths", "assists", "currentGold", "goldEarned", "level", "minionsKilled",
+    "dragonKills", "voidgrubKills", "baronKills", "heraldKills", "atakhanKills", "structuresKilled",
+    "boughtItem",
+]
+SKILL_SLOTS = 4
+# Values that never change during a match, stored once per participant
+STATIC_FIELDS = ["participantId", "puuid", "championId", "teamId", "lane", "perks", "tier", "championName", "origin"]
+# Key order of the frame dicts written by extract_features
+FRAME_FIELDS = [
+    "kills", "deaths", "assists", "items", "skills", "currentGold", "goldEarned", "level", "minionsKilled",
+    "dragonKills", "voidgrubKills", "baronKills", "heraldKills", "atakhanKills", "structuresKilled", "boughtItem",
+] + STATIC_FIELDS
+
+def is_compact(match_timeline):
+    return match_timeline.get("format") == COMPACT_FORMAT
+
+def encode_match(frames):
+    """
+    Encode {timestamp: {participantId: features}} into static metadata per participant
+    plus, for every frame, one row of stats + skills and the item list of each participant.
+    """
+    timestamps = list(frames.keys())
+    first_frame = frames[timestamps[0]]
+    participants = list(first_frame.keys())
+    stats = []
+    items = []
+    for ts in timestamps:
+        frame = frames[ts]
+        stats.append([
+            [int(frame[pid][field]) for field in STAT_FIELDS] + list(frame[pid]["skills"])
+            for pid in participants
+        ])
+        items.append([frame[pid]["items"] for pid in participants])
+    return {
+        "format": COMPACT_FORMAT,
+        "timestamps": [int(ts) for ts in timestamps],
+        "static": [
+            {field: first_frame[pid][field] for field in STATIC_FIELDS}
+            for pid in participants
+        ],
+        "stats": stats,
+        "items": items,
+    }
+
+def decode_frame(match_timeline, index):
+    """Rebuild the {participantId: features} dict of a single frame of a compact match."""
+    frame = {}
+    for static, row, items in zip(match_timeline["static"], match_timeline["stats"][index], match_timeline["items"][index]):
+        features = dict(zip(STAT_FIELDS, row))
+        features["boughtItem"] = bool(features["boughtItem"])
+        features["items"] = list(items)
+        features["skills"] = row[len(STAT_FIELDS):len(STAT_FIELDS) + SKILL_SLOTS]
+        features.update(static)
+        frame[str(static["participantId"])] = {field: features[field] for field in FRAME_FIELDS}
+    return frame
+
+def decode_match(match_timeline):
+    """Rebuild {timestamp: {participantId: features}} with the same keys json.load gives for the old format."""
+    if not is_compact(match_timeline):
+        return match_timeline
+    return {
+        str(ts): decode_frame(match_timeline, i)
+        for i, ts in enumerate(match_timeline["timestamps"])
+    }
+
+def encode_timeline_features(all_timeline_features):
+    return {
+        match_id: encode_match(frames)
+        for match_id, frames in all_timeline_features.items()
+    }
+
+def load_timeline_features(path, decode=True):
+    """
+    Load a timeline_features_ID*.json file in either format. With decode=False compact
+    matches are returned as is, so frames can be rebuilt on demand with decode_frame.
+    """
+    with open(path, "r", encoding="utf-8") as fp:
+        all_timeline_features = json.load(fp)
+    if not decode:
+        return all_timeline_features
+    return {
+        match_id: decode_match(match_timeline)
+        for match_id, match_timeline in all_timeline_features.items()
+    }
+
+# Columns of the Parquet output, one row per (match, timeframe, participant)
+DICTIONARY_COLUMNS = ["matchId", "puuid", "lane", "tier", "championName", "origin"]
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema(
+        [
+            ("matchId", pa.dictionary(pa.int32(), pa.string())),
+            ("timeframe", pa.int64()),
+            ("participantId", pa.int8()),
+            ("puuid", pa.dictionary(pa.int32(), pa.string())),
+            ("championId", pa.int16()),
+            ("championName", pa.dictionary(pa.int32(), pa.string())),
+            ("teamId", pa.int16()),
+            ("lane", pa.dictionary(pa.int32(), pa.string())),
+            ("tier", pa.dictionary(pa.int32(), pa.string())),
+            ("origin", pa.dictionary(pa.int32(), pa.string())),
+            ("perks", pa.list_(pa.int32())),
+            ("items", pa.list_(pa.int32())),
+            ("skills", pa.list_(pa.int8())),
+        ] + [
+            (field, pa.bool_() if field == "boughtItem" else pa.int32())
+            for field in STAT_FIELDS
+        ]
+    )
+
+def timeline_features_to_table(all_timeline_features):
+    """Flatten {matchId: {timestamp: {participantId: features}}} into a typed Arrow table."""
+    import pyarrow as pa
+    schema = _parquet_schema()
+    columns = {name: [] for name in schema.names}
+    for match_id, frames in all_timeline_features.items():
+        for ts, frame in frames.items():
+            for features in frame.values():
+                columns["matchId"].append(match_id)
+                columns["timeframe"].append(int(ts))
+                for field in STATIC_FIELDS + STAT_FIELDS + ["items", "skills"]:
+                    columns[field].append(features[field])
+    arrays = []
+    for field in schema:
+        if field.name in DICTIONARY_COLUMNS:
+            arrays.append(pa.array(columns[field.name], type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def write_timeline_parquet(path, all_timeline_features):
+    import pyarrow.parquet as pq
+    pq.write_table(timeline_features_to_table(all_timeline_features), path, compression="zstd")
+
+def read_timeline_parquet(path, columns=None):
+    """Read a timeline_features_ID*.parquet file as a DataFrame, optionally only some columns."""
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=columns).to_pandas()
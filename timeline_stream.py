@@ -0,0 +1,142 @@
+import json
+import codecs
+
+CHUNK_SIZE = 256 * 1024
+# Events the extract_match replay loop reads, every other event type is dropped while parsing
+USED_EVENTS = frozenset([
+    "ITEM_PURCHASED", "ITEM_SOLD", "ITEM_UNDO", "ITEM_DESTROYED",
+    "CHAMPION_KILL", "SKILL_LEVEL_UP", "ELITE_MONSTER_KILL", "BUILDING_KILL",
+])
+PARTICIPANT_FRAME_FIELDS = ("currentGold", "totalGold", "level", "minionsKilled", "jungleMinionsKilled")
+WHITESPACE = " \t\n\r"
+
+class _StreamReader:
+    """
+    Reads JSON values one at a time from a text file, keeping only a chunk of the
+    file (plus the value being decoded) in memory.
+    """
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what was already consumed before growing the buffer
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON file")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.pos}, found {self.buffer[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut at the end of the buffer would still decode, so wait for the next char
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self):
+        """Iterate the keys of the object at the current position, the caller reads each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' at {self.pos - 1}, found {char!r}")
+
+    def elements(self):
+        """Iterate the values of the array at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' at {self.pos - 1}, found {char!r}")
+
+def slim_frame(frame):
+    """The parts of a timeline frame extract_match uses."""
+    return {
+        "timestamp": frame.get("timestamp", {}),
+        "participantFrames": {
+            participant_id: {field: participant_frame[field] for field in PARTICIPANT_FRAME_FIELDS}
+            for participant_id, participant_frame in frame.get("participantFrames", {}).items()
+        },
+        "events": [event for event in frame.get("events", []) if event["type"] in USED_EVENTS],
+    }
+
+def _open_binary(path):
+    return open(path, "rb")
+
+def iter_timeline_frames(source, chunk_size=CHUNK_SIZE, opener=None):
+    """
+    Yield the slimmed frames of a match-v5 timeline one at a time, without loading the
+    whole document: only the frame being parsed and a chunk of the file are kept.
+    opener turns source into a binary stream, by default source is a file path.
+    """
+    with (opener or _open_binary)(source) as binary_fp:
+        fp = codecs.getreader("utf-8")(binary_fp)
+        reader = _StreamReader(fp, chunk_size)
+        for key in reader.items():
+            if key != "info":
+                reader.value()
+                continue
+            for info_key in reader.items():
+                if info_key != "frames":
+                    reader.value()
+                    continue
+                for frame in reader.elements():
+                    yield slim_frame(frame)
+
+def mark_last(iterable):
+    """Yield (item, is_last) pairs, looking one item ahead."""
+    iterator = iter(iterable)
+    try:
+        previous = next(iterator)
+    except StopIteration:
+        return
+    for item in iterator:
+        yield previous, False
+        previous = item
+    yield previous, True